@@ -1,45 +1,10 @@
 import io
-import boto3
-from botocore.client import Config
 from fastapi import HTTPException
 from docx import Document
 from docx.shared import Pt
 
-from core.config import (
-    MINIO_ACCESS_KEY,
-    MINIO_SECRET_KEY,
-    MINIO_REGION,
-    MINIO_BUCKET,
-    MINIO_ENDPOINT_INTERNAL,
-    MINIO_ENDPOINT_PUBLIC,
-)
-
-s3_internal = boto3.client(
-    "s3",
-    endpoint_url=MINIO_ENDPOINT_INTERNAL,
-    aws_access_key_id=MINIO_ACCESS_KEY,
-    aws_secret_access_key=MINIO_SECRET_KEY,
-    region_name=MINIO_REGION,
-    config=Config(
-        signature_version="s3v4",
-        s3={"addressing_style": "path"},
-        connect_timeout=5,
-        read_timeout=15,
-        retries={"max_attempts": 2},
-    ),
-)
-
-s3_public = boto3.client(
-    "s3",
-    endpoint_url=MINIO_ENDPOINT_PUBLIC,
-    aws_access_key_id=MINIO_ACCESS_KEY,
-    aws_secret_access_key=MINIO_SECRET_KEY,
-    region_name=MINIO_REGION,
-    config=Config(
-        signature_version="s3v4",
-        s3={"addressing_style": "path"},
-    ),
-)
+from core.config import MINIO_BUCKET
+from core.s3_config import get_s3_internal, public_presigner
 
 SUPPORTED_TYPES = {"pdf", "docx", "doc"}
 
@@ -58,6 +23,11 @@ async def _get_file(file_id: str, user: dict):
     )
     if not file_doc:
         raise HTTPException(status_code=404, detail="File not found")
+    if file_doc.get("quarantined"):
+        raise HTTPException(status_code=403, detail="File is quarantined")
+    if file_doc.get("pack_offset") is not None:
+        # Saving would overwrite the whole pack object
+        raise HTTPException(status_code=409, detail="Packed files can't be edited")
     return file_doc
 
 
@@ -75,15 +45,8 @@ class EditorController:
                 status_code=400, detail=f"Unsupported file type: .{ext}"
             )
 
-        url = s3_public.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": MINIO_BUCKET,
-                "Key": storage_key,
-                # No ResponseContentDisposition — let browser decide
-            },
-            ExpiresIn=3600,
-        )
+        # No response-content-disposition — let browser decide
+        url = public_presigner.presign("GET", storage_key, 3600)
 
         return {
             "file_id": file_id,
@@ -99,8 +62,10 @@ class EditorController:
         await _get_file(file_id, user)  # auth check
 
         try:
-            obj = s3_internal.get_object(Bucket=MINIO_BUCKET, Key=storage_key)
-            data = obj["Body"].read()
+            s3_internal = await get_s3_internal()
+            obj = await s3_internal.get_object(Bucket=MINIO_BUCKET, Key=storage_key)
+            async with obj["Body"] as body:
+                data = await body.read()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Storage fetch failed: {e}")
 
@@ -159,7 +124,8 @@ class EditorController:
             raise HTTPException(status_code=500, detail=f"Failed to build DOCX: {e}")
 
         try:
-            s3_internal.put_object(
+            s3_internal = await get_s3_internal()
+            await s3_internal.put_object(
                 Bucket=MINIO_BUCKET,
                 Key=storage_key,
                 Body=buf.getvalue(),
@@ -11,29 +11,65 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
 #
 import asyncio
+import base64
 import os
 import hashlib
+import hmac
+import json
 import logging
 from uuid import uuid4
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from collections import defaultdict
 from contextlib import asynccontextmanager
 from functools import wraps
+from email.utils import format_datetime
+from urllib.parse import quote, unquote_plus
 import time
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi import HTTPException
 from botocore.exceptions import ClientError, BotoCoreError
-import magic  # python-magic for real mime detection
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from core.database import get_db
 from core.s3_config import (
-    s3_client,
-    s3_internal,
-    s3_public,
-    generate_presigned_upload_url,
+    get_s3_internal,
+    public_presigner,
+    DELETE_OBJECTS_MAX_KEYS,
+    delete_many_from_storage,
 )
-from core.config import MINIO_BUCKET
+from core.config import API_PUBLIC_URL, MINIO_BUCKET, MINIO_WEBHOOK_TOKEN
+from core.storage_refs import (
+    add_refs,
+    release_refs,
+    touch_refs,
+    claim_unreferenced,
+    requeue_unreferenced,
+    with_thumbnails,
+)
+from core.storage_delete import delete_objects
+from core.file_stats import (
+    USER_SCOPE,
+    SESSION_SCOPE,
+    add_live_files,
+    get_file_stats,
+    remove_live_files,
+)
+from core.retention import apply_retention
 from core.permission_engine import PermissionEngine
+from utils.content_sniffer import (
+    SNIFF_BYTES,
+    detect_mime,
+    sniff_object,
+    sniff_pack,
+)
+from utils.thumbnails import (
+    PREVIEWABLE_MIME_TYPES,
+    THUMBNAIL_SUFFIX,
+    generate_thumbnail,
+    thumbnail_key,
+)
+from utils.pagination import keyset_filter, next_cursor
 from models.history_model import UserMeta, FileMeta, TransferHistory
 
 from bson import ObjectId
@@ -42,6 +78,47 @@ from datetime import datetime
 logger = logging.getLogger(__name__)
 
 
+def _iso_date(field: str) -> Dict[str, Any]:
+    """Projection expression rendering a date as ISO text on the server"""
+    return {
+        "$dateToString": {"date": f"${field}", "format": "%Y-%m-%dT%H:%M:%S.%L"}
+    }
+
+
+SESSION_LIST_PROJECTION = {
+    "_id": 0,
+    "file_id": 1,
+    "filename": 1,
+    "size": 1,
+    "mime_type": 1,
+    "detected_mime": 1,
+    "storage_key": 1,
+    "sender_ID": 1,
+    "sharing_session_id": 1,
+    "is_shared": 1,
+    "is_deleted": 1,
+    "quarantined": 1,
+    "inspection_status": 1,
+    "preview_status": 1,
+    "thumbnail_key": 1,
+    "pack_id": 1,
+    "created_at": _iso_date("created_at"),
+    "updated_at": _iso_date("updated_at"),
+    "expires_at": _iso_date("expires_at"),
+    "deleted_at": _iso_date("deleted_at"),
+}
+
+USER_LIST_PROJECTION = {
+    "_id": 0,
+    "file_id": 1,
+    "filename": 1,
+    "size": 1,
+    "created_at": _iso_date("created_at"),
+    "storage_key": 1,
+    "thumbnail_key": 1,
+}
+
+
 class FileUploadError(Exception):
     """Base exception for file upload errors"""
 
@@ -278,6 +355,45 @@ class FileValidator:
         "application/x-tar",
     }
 
+    # Never served, whatever the upload claimed to be
+    DANGEROUS_MIME_TYPES = {
+        "application/x-dosexec",
+        "application/x-msdownload",
+        "application/x-executable",
+        "application/x-sharedlib",
+        "application/x-pie-executable",
+        "application/x-mach-binary",
+        "application/x-elf",
+        "text/x-shellscript",
+        "text/x-msdos-batch",
+    }
+
+    # Declared types whose content must really be of that family
+    STRICT_MIME_FAMILIES = {"image", "audio", "video", "application/pdf"}
+
+    @staticmethod
+    def mime_mismatch(declared: Optional[str], detected: str) -> Optional[str]:
+        """Why a file is quarantined: executable content, or unlike its declared type.
+
+        Detected types are libmagic's names (audio/x-wav, text/xml,
+        application/octet-stream, ...), which don't line up with
+        ALLOWED_MIME_TYPES, so only the denylist and family checks apply.
+        """
+        if detected in FileValidator.DANGEROUS_MIME_TYPES:
+            return f"Executable content ({detected})"
+
+        if not declared or declared == detected:
+            return None
+
+        family = declared.split("/")[0]
+        if family in FileValidator.STRICT_MIME_FAMILIES:
+            if detected.split("/")[0] != family:
+                return f"Declared {declared} but content is {detected}"
+        elif declared in FileValidator.STRICT_MIME_FAMILIES:
+            return f"Declared {declared} but content is {detected}"
+
+        return None
+
     @staticmethod
     def validate_filename(filename: str) -> str:
         """Sanitize and validate filename"""
@@ -298,31 +414,16 @@ class FileValidator:
 
         return safe_name
 
-    @staticmethod
-    async def validate_mime_type(file_content: bytes, declared_mime: str) -> str:
-        """Validate MIME type using actual file content"""
-        try:
-            detected_mime = magic.from_buffer(file_content[:2048], mime=True)
-
-            if detected_mime not in FileValidator.ALLOWED_MIME_TYPES:
-                raise ValidationError(f"File type {detected_mime} not allowed")
-
-            if detected_mime != declared_mime:
-                logger.warning(
-                    f"MIME type mismatch: declared={declared_mime}, "
-                    f"detected={detected_mime}"
-                )
-
-            return detected_mime
-        except Exception as e:
-            logger.error(f"MIME type detection failed: {e}")
-            raise ValidationError("Could not verify file type")
-
     @staticmethod
     def calculate_checksum(content: bytes) -> str:
         """Calculate SHA-256 checksum for file integrity"""
         return hashlib.sha256(content).hexdigest()
 
+    @staticmethod
+    def checksum_header(sha256_hex: str) -> str:
+        """Hex SHA-256 -> base64 value for the S3 `x-amz-checksum-sha256` header"""
+        return base64.b64encode(bytes.fromhex(sha256_hex)).decode()
+
 
 class QuotaManager:
     """Manage user upload quotas"""
@@ -393,13 +494,42 @@ class QuotaManager:
 class FileController:
     """Production-grade file sharing controller"""
 
-    MAX_FILE_SIZE = 20 * 1024 * 1024
+    MAX_FILE_SIZE = 1024 * 1024 * 1024
+    MAX_SINGLE_PUT_SIZE = 20 * 1024 * 1024
     MAX_FILES_PER_REQUEST = 30
     PARALLEL_LIMIT = 10
     CHUNK_SIZE = 5 * 1024 * 1024
+    MAX_PARTS = 10000
+    MULTIPART_URL_EXPIRES = 3600
+    POST_POLICY_EXPIRES = 3600
+    MULTIPART_STALE_AFTER = timedelta(hours=24)
+    # Parts of a proxied stream uploading at once; bounds memory per upload
+    STREAM_PARTS_IN_FLIGHT = 2
+    # Small files can be concatenated into one pack object (one PUT, one HEAD)
+    PACK_MAX_FILE_SIZE = 1024 * 1024
+    PACK_MAX_FILES = 5000
+    PACK_MAX_SIZE = MAX_SINGLE_PUT_SIZE
+    PACK_URL_EXPIRES = 600
+    PROXY_READ_CHUNK = 256 * 1024
+    CONTENT_ADDRESSED_PREFIX = "blobs/sha256/"
+    INSPECTION_CONCURRENCY = 16
+    INSPECTION_MAX_ATTEMPTS = 3
+    # Previews need the whole object in memory, so large sources are skipped
+    PREVIEW_MAX_SOURCE_SIZE = 50 * 1024 * 1024
+    PREVIEW_CONCURRENCY = 4
+    PREVIEW_MAX_ATTEMPTS = 3
+    PREVIEW_URL_EXPIRES = 600
+    # Listings page on (created_at, file_id); streams read in cursor batches
+    LIST_PAGE_SIZE = 100
+    LIST_MAX_PAGE_SIZE = 500
+    LIST_STREAM_BATCH = 500
+    LIST_SORT = [("created_at", -1), ("file_id", -1)]
 
     UPLOAD_SEMAPHORE = asyncio.Semaphore(PARALLEL_LIMIT)
 
+    # Keeps fire-and-forget inspection and preview tasks alive until they finish
+    _background_tasks = set()
+
     # Shared instances
     circuit_breaker = CircuitBreaker(
         failure_threshold=5,
@@ -497,8 +627,53 @@ class FileController:
 
             sharing_session_id = session["sharing_session_ID"]
 
-            tasks = [self._generate_presigned_url(f, sharing_session_id) for f in files]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            results = [None] * len(files)
+
+            # Content this sender already stores needs no upload at all
+            blobs = await self._find_blobs(
+                [f.sha256 for f in files if f.sha256], session["sender_ID"]
+            )
+            for i, f in enumerate(files):
+                blob = blobs.get(f.sha256)
+                if blob and blob["size"] == f.size:
+                    results[i] = self._deduplicated_result(f)
+
+            single = [
+                i
+                for i, f in enumerate(files)
+                if results[i] is None and f.size <= self.MAX_SINGLE_PUT_SIZE
+            ]
+            multipart = [
+                i
+                for i, f in enumerate(files)
+                if results[i] is None and f.size > self.MAX_SINGLE_PUT_SIZE
+            ]
+
+            # Single-PUT URLs are signed locally in one pass; only multipart
+            # files need a storage round trip (CreateMultipartUpload).
+            single_results = self._presign_single_batch(
+                [files[i] for i in single], sharing_session_id
+            )
+            # Keep GC off blobs that are about to be uploaded again
+            await touch_refs(
+                r["storage_key"] for r in single_results if r.get("sha256")
+            )
+            await self._record_blob_uploads(
+                [r for r in single_results if r.get("sha256")], session
+            )
+            for i, result in zip(single, single_results):
+                results[i] = result
+
+            if multipart:
+                tasks = [
+                    self._generate_multipart_upload(files[i], sharing_session_id)
+                    for i in multipart
+                ]
+                multipart_results = await asyncio.gather(
+                    *tasks, return_exceptions=True
+                )
+                for i, result in zip(multipart, multipart_results):
+                    results[i] = result
 
             successful_results = []
             errors = []
@@ -536,11 +711,149 @@ class FileController:
             logger.error(f"Upload initialization failed: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail="Failed to initialize upload")
 
+    async def init_upload_policy(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """One presigned POST policy covering the whole `{sharing_session_id}/` prefix.
+
+        Clients upload any number of files with it, each under
+        `{sharing_session_id}/{file_id}_{filename}` with a client-generated
+        UUID, and register them through complete_upload as usual.
+        """
+        if not session or not session.get("sharing_session_ID"):
+            raise HTTPException(status_code=401, detail="Invalid session")
+
+        rate_key = f"{session['sender_ID']}:{session['sharing_session_ID']}"
+        if not await self.rate_limiter.acquire(rate_key):
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please wait before uploading more files.",
+            )
+
+        key_prefix = f"{session['sharing_session_ID']}/"
+        post = public_presigner.presign_post(
+            key_prefix,
+            max_size=self.MAX_SINGLE_PUT_SIZE,
+            expires=self.POST_POLICY_EXPIRES,
+        )
+
+        return {
+            "upload_mode": "post_policy",
+            "url": post["url"],
+            "fields": post["fields"],
+            "key_prefix": key_prefix,
+            "key_format": f"{key_prefix}{{file_id}}_{{filename}}",
+            "max_file_size": self.MAX_SINGLE_PUT_SIZE,
+            "expires_in": self.POST_POLICY_EXPIRES,
+        }
+
+    def _blob_key(self, sha256: str) -> str:
+        return f"{self.CONTENT_ADDRESSED_PREFIX}{sha256[:2]}/{sha256}"
+
+    async def _find_blobs(
+        self, hashes: List[str], sender_id: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """Content hashes already backed by one of the sender's live files -> size/etag.
+
+        Scoped to the sender: a claimed hash is not proof of holding the bytes,
+        so another user's blob is only reachable through a checksum-signed PUT.
+        """
+        if not hashes:
+            return {}
+
+        docs = await self.db.files.find(
+            {
+                "content_sha256": {"$in": list(set(hashes))},
+                "sender_ID": sender_id,
+                "is_deleted": False,
+            },
+            {"_id": 0, "content_sha256": 1, "size": 1, "etag": 1},
+        ).to_list(length=None)
+
+        return {doc["content_sha256"]: doc for doc in docs}
+
+    async def _record_blob_uploads(
+        self, results: List[Dict[str, Any]], session: Dict[str, Any]
+    ) -> None:
+        """Remember which content-addressed PUTs were signed for whom, and when"""
+        if not results:
+            return
+
+        now = datetime.utcnow()
+        await self.db.blob_uploads.insert_many(
+            [
+                {
+                    "file_id": r["file_id"],
+                    "storage_key": r["storage_key"],
+                    "sender_ID": session["sender_ID"],
+                    "created_at": now,
+                }
+                for r in results
+            ],
+            ordered=False,
+        )
+
+    def _deduplicated_result(self, file_data: Any) -> Dict[str, Any]:
+        return {
+            "file_id": str(uuid4()),
+            "filename": FileValidator.validate_filename(file_data.filename),
+            "storage_key": self._blob_key(file_data.sha256),
+            "size": file_data.size,
+            "content_type": file_data.content_type,
+            "sha256": file_data.sha256,
+            "upload_mode": "deduplicated",
+        }
+
+    def _presign_single_batch(
+        self, files: List[Any], sharing_session_id: str
+    ) -> List[Dict[str, Any]]:
+        """Build storage keys and sign one PUT URL per file in a single presign pass.
+
+        Files declaring a sha256 go to their content-addressed key with the
+        checksum header signed in, so storage rejects bytes that don't match.
+        """
+        results = []
+        requests = []
+
+        for file_data in files:
+            file_id = str(uuid4())
+            safe_name = FileValidator.validate_filename(file_data.filename)
+
+            headers = {}
+            if file_data.content_type:
+                headers["Content-Type"] = file_data.content_type
+
+            result = {
+                "file_id": file_id,
+                "filename": safe_name,
+                "size": file_data.size,
+                "content_type": file_data.content_type,
+                "upload_mode": "single",
+            }
+
+            if file_data.sha256:
+                object_key = self._blob_key(file_data.sha256)
+                headers["x-amz-checksum-sha256"] = FileValidator.checksum_header(
+                    file_data.sha256
+                )
+                result["sha256"] = file_data.sha256
+                result["upload_headers"] = headers
+            else:
+                object_key = f"{sharing_session_id}/{file_id}_{safe_name}"
+
+            result["storage_key"] = object_key
+            requests.append((object_key, None, headers or None))
+            results.append(result)
+
+        urls = public_presigner.presign_many("PUT", requests, expires=600)
+        for result, url in zip(results, urls):
+            result["upload_url"] = url
+
+        return results
+
     @async_retry(max_attempts=3, delay=0.5, exceptions=(ClientError, BotoCoreError))
-    async def _generate_presigned_url(
+    async def _generate_multipart_upload(
         self, file_data: Any, sharing_session_id: str
     ) -> Dict[str, Any]:
-        """Generate presigned URL for file upload with circuit breaker"""
+        """Start a multipart upload for one large file with circuit breaker"""
         async with self.UPLOAD_SEMAPHORE:
 
             async def _generate():
@@ -548,237 +861,1695 @@ class FileController:
                 safe_name = FileValidator.validate_filename(file_data.filename)
                 object_key = f"{sharing_session_id}/{file_id}_{safe_name}"
 
-                loop = asyncio.get_event_loop()
-                url = await loop.run_in_executor(
-                    None,
-                    generate_presigned_upload_url,
-                    object_key,
-                    file_data.content_type,
-                )
-
-                return {
+                result = {
                     "file_id": file_id,
                     "filename": safe_name,
                     "storage_key": object_key,
-                    "upload_url": url,
                     "size": file_data.size,
                     "content_type": file_data.content_type,
                 }
+                result.update(
+                    await self._init_multipart(
+                        file_id, object_key, file_data, sharing_session_id
+                    )
+                )
+                return result
 
             return await self.circuit_breaker.call(_generate)
 
-    async def complete_upload(
-        self, files: List[Dict[str, Any]], session: Dict[str, Any]
+    def _part_size_for(self, size: int) -> int:
+        """Smallest part size >= CHUNK_SIZE that keeps the upload within MAX_PARTS"""
+        part_size = self.CHUNK_SIZE
+        while part_size * self.MAX_PARTS < size:
+            part_size += self.CHUNK_SIZE
+        return part_size
+
+    def _presign_parts(
+        self, storage_key: str, upload_id: str, part_numbers: List[int]
+    ) -> List[Dict[str, Any]]:
+        urls = public_presigner.presign_many(
+            "PUT",
+            [
+                (
+                    storage_key,
+                    {"partNumber": str(n), "uploadId": upload_id},
+                    None,
+                )
+                for n in part_numbers
+            ],
+            expires=self.MULTIPART_URL_EXPIRES,
+        )
+
+        return [
+            {"part_number": n, "upload_url": url} for n, url in zip(part_numbers, urls)
+        ]
+
+    async def _init_multipart(
+        self,
+        file_id: str,
+        storage_key: str,
+        file_data: Any,
+        sharing_session_id: str,
     ) -> Dict[str, Any]:
-        start_time = time.time()
+        """Start an S3 multipart upload, record its manifest and presign every part"""
+        params = {"Bucket": MINIO_BUCKET, "Key": storage_key}
+        if file_data.content_type:
+            params["ContentType"] = file_data.content_type
 
-        try:
-            if not session or not session.get("sharing_session_ID"):
-                raise HTTPException(status_code=401, detail="Invalid session")
+        s3_internal = await get_s3_internal()
+        upload = await s3_internal.create_multipart_upload(**params)
+        upload_id = upload["UploadId"]
 
-            if not files:
-                raise HTTPException(status_code=400, detail="No files provided")
+        part_size = self._part_size_for(file_data.size)
+        total_parts = -(-file_data.size // part_size)
 
-            verification_tasks = [
-                self._verify_and_prepare_document(f, session) for f in files
-            ]
-            results = await asyncio.gather(*verification_tasks, return_exceptions=True)
+        await self.db.upload_manifests.insert_one(
+            {
+                "file_id": file_id,
+                "storage_key": storage_key,
+                "upload_id": upload_id,
+                "sharing_session_id": sharing_session_id,
+                "filename": FileValidator.validate_filename(file_data.filename),
+                "content_type": file_data.content_type,
+                "size": file_data.size,
+                "part_size": part_size,
+                "total_parts": total_parts,
+                "parts_received": [],
+                "status": "in_progress",
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+            }
+        )
 
-            successful_docs = []
-            failed_files = []
-            total_size = 0
+        return {
+            "upload_mode": "multipart",
+            "upload_id": upload_id,
+            "part_size": part_size,
+            "total_parts": total_parts,
+            "parts": self._presign_parts(
+                storage_key, upload_id, list(range(1, total_parts + 1))
+            ),
+            "parts_expires_in": self.MULTIPART_URL_EXPIRES,
+        }
 
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    failed_files.append(
-                        {"file_id": files[i].get("file_id"), "error": str(result)}
-                    )
-                    await self.metrics.record_error()
-                else:
-                    successful_docs.append(result)
-                    total_size += result["size"]
+    async def _get_manifest(
+        self, file_id: str, session: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        manifest = await self.db.upload_manifests.find_one(
+            {
+                "file_id": file_id,
+                "sharing_session_id": session["sharing_session_ID"],
+                "upload_mode": {"$ne": "stream"},
+            },
+            {"_id": 0},
+        )
 
-            saved_count = 0
-            if successful_docs:
-                try:
-                    saved_count = await self._save_documents_batch(successful_docs)
+        if not manifest:
+            raise HTTPException(status_code=404, detail="Upload not found")
 
-                    await self.quota_manager.increment_usage(
-                        user_id=session["sender_ID"],
-                        session_id=session["sharing_session_ID"],
-                        size=total_size,
-                    )
+        return manifest
 
-                    duration = time.time() - start_time
-                    await self.metrics.record_upload(total_size, duration)
+    async def _list_uploaded_parts(
+        self, storage_key: str, upload_id: str
+    ) -> List[Dict[str, Any]]:
+        """Parts S3 has actually received for an upload (ListParts, all pages)"""
+        s3_internal = await get_s3_internal()
+        paginator = s3_internal.get_paginator("list_parts")
+        parts = []
 
-                except Exception as e:
-                    logger.error(f"Database save failed: {e}", exc_info=True)
-                    cleanup_tasks = [
-                        self._cleanup_storage(doc["storage_key"])
-                        for doc in successful_docs
-                    ]
-                    await asyncio.gather(*cleanup_tasks, return_exceptions=True)
-                    raise HTTPException(
-                        status_code=500, detail="Failed to save file metadata"
-                    )
+        async for page in paginator.paginate(
+            Bucket=MINIO_BUCKET, Key=storage_key, UploadId=upload_id
+        ):
+            for part in page.get("Parts", []):
+                parts.append(
+                    {
+                        "part_number": part["PartNumber"],
+                        "etag": part["ETag"].strip('"'),
+                        "size": part["Size"],
+                    }
+                )
 
-            duration = time.time() - start_time
-            logger.info(
-                f"Upload completion finished in {duration:.2f}s. "
-                f"Saved: {saved_count}, Failed: {len(failed_files)}, "
-                f"Total size: {total_size / 1024 / 1024:.2f}MB"
+        return parts
+
+    async def _sync_manifest_parts(self, manifest: Dict[str, Any]):
+        """Refresh the manifest from ListParts and return (received, missing)"""
+        try:
+            received = await self._list_uploaded_parts(
+                manifest["storage_key"], manifest["upload_id"]
             )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchUpload":
+                raise HTTPException(status_code=410, detail="Upload no longer exists")
+            raise
 
-            response = {
-                "success": True,
-                "files_saved": saved_count,
-                "total_size": total_size,
-            }
+        await self.db.upload_manifests.update_one(
+            {"file_id": manifest["file_id"]},
+            {"$set": {"parts_received": received, "updated_at": datetime.utcnow()}},
+        )
 
-            if failed_files:
-                response["failed_files"] = failed_files
+        landed = {p["part_number"] for p in received}
+        missing = [
+            n for n in range(1, manifest["total_parts"] + 1) if n not in landed
+        ]
 
-            print("complete upload response = ", response)
+        return received, missing
 
-            return response
+    async def multipart_status(
+        self, file_id: str, session: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Tell a reconnecting client which parts are still missing, with fresh URLs"""
+        manifest = await self._get_manifest(file_id, session)
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            await self.metrics.record_error()
-            logger.error(f"Upload completion failed: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Failed to complete upload")
+        if manifest["status"] != "in_progress":
+            return {
+                "file_id": file_id,
+                "status": manifest["status"],
+                "missing_parts": [],
+                "parts": [],
+            }
 
-    @async_retry(max_attempts=3, delay=0.5, exceptions=(ClientError, BotoCoreError))
-    async def _verify_and_prepare_document(
-        self, file_info: Dict[str, Any], session: Dict[str, Any]
-    ) -> Dict[str, Any]:
+        received, missing = await self._sync_manifest_parts(manifest)
 
-        async def _verify():
-            loop = asyncio.get_event_loop()
-            try:
-                metadata = await loop.run_in_executor(
-                    None,
-                    lambda: s3_internal.head_object(
-                        Bucket=MINIO_BUCKET,
-                        Key=file_info["storage_key"],
-                    ),
-                )
-            except ClientError as e:
-                if e.response["Error"]["Code"] == "404":
-                    raise StorageError(
-                        f"File {file_info['storage_key']} not found in storage"
-                    )
-                raise
+        return {
+            "file_id": file_id,
+            "status": manifest["status"],
+            "storage_key": manifest["storage_key"],
+            "upload_id": manifest["upload_id"],
+            "part_size": manifest["part_size"],
+            "total_parts": manifest["total_parts"],
+            "received_parts": [p["part_number"] for p in received],
+            "missing_parts": missing,
+            "parts": self._presign_parts(
+                manifest["storage_key"], manifest["upload_id"], missing
+            ),
+            "parts_expires_in": self.MULTIPART_URL_EXPIRES,
+        }
+
+    async def complete_multipart(
+        self, payload: Dict[str, Any], session: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Stitch uploaded parts into the final object (CompleteMultipartUpload)
 
-            # Extract metadata
-            actual_size = metadata.get("ContentLength", file_info.get("size", 0))
-            etag = metadata.get("ETag", "").strip('"')
+        Part ETags come from the client when given, otherwise from ListParts.
+        """
+        manifest = await self._get_manifest(payload["file_id"], session)
 
+        if manifest["status"] == "completed":
             return {
-                "file_id": file_info["file_id"],
-                "sharing_session_id": session["sharing_session_ID"],
-                "sender_ID": session["sender_ID"],
-                "sender_type": session["sender_type"],
-                "storage_key": file_info["storage_key"],
-                "size": actual_size,
-                "mime_type": file_info.get("content_type"),
-                "filename": file_info.get("filename"),
-                "etag": etag,
-                "is_deleted": False,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow(),
+                "success": True,
+                "file_id": manifest["file_id"],
+                "storage_key": manifest["storage_key"],
+                "etag": manifest.get("etag"),
             }
 
-        return await self.circuit_breaker.call(_verify)
-
-    async def _save_documents_batch(self, docs: List[Dict[str, Any]]) -> int:
-        """Save documents to database with batching"""
-        if not docs:
-            return 0
-
-        BATCH_SIZE = 100
-        saved_count = 0
+        if manifest["status"] != "in_progress":
+            raise HTTPException(status_code=410, detail="Upload was aborted")
 
-        for i in range(0, len(docs), BATCH_SIZE):
-            batch = docs[i : i + BATCH_SIZE]
-            try:
-                result = await self.db.files.insert_many(
-                    batch,
-                    ordered=False,
+        if payload.get("parts"):
+            parts = sorted(payload["parts"], key=lambda p: p["part_number"])
+        else:
+            parts, missing = await self._sync_manifest_parts(manifest)
+            if missing:
+                raise HTTPException(
+                    status_code=409,
+                    detail={"message": "Upload incomplete", "missing_parts": missing},
                 )
-                saved_count += len(result.inserted_ids)
-                ""
-            except Exception as e:
-                logger.error(f"Batch insert failed: {e}", exc_info=True)
-                # Try to save individually
-                for doc in batch:
-                    try:
-                        await self.db.files.insert_one(doc)
-                        saved_count += 1
-                    except Exception as inner_e:
-                        logger.error(
-                            f"Failed to save document {doc['file_id']}: {inner_e}"
-                        )
-
-        return saved_count
 
-    @async_retry(max_attempts=2, delay=1.0, exceptions=(ClientError, BotoCoreError))
-    async def _cleanup_storage(self, storage_key: str) -> None:
-        """Cleanup file from storage"""
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: s3_internal.delete_object(Bucket=MINIO_BUCKET, Key=storage_key),
+            s3_internal = await get_s3_internal()
+            result = await s3_internal.complete_multipart_upload(
+                Bucket=MINIO_BUCKET,
+                Key=manifest["storage_key"],
+                UploadId=manifest["upload_id"],
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": p["part_number"], "ETag": p["etag"]}
+                        for p in parts
+                    ]
+                },
+            )
+        except ClientError as e:
+            # InvalidPart / NoSuchUpload are client mistakes, not storage outages
+            logger.warning(f"Multipart completion failed for {payload['file_id']}: {e}")
+            raise HTTPException(
+                status_code=400, detail=e.response["Error"].get("Message", str(e))
             )
-            logger.info(f"Cleaned up storage key: {storage_key}")
-        except Exception as e:
-            logger.error(f"Failed to cleanup {storage_key}: {e}")
-            # Don't raise - cleanup is best effort
-
-    async def get_metrics(self) -> Dict[str, Any]:
-        """Get system metrics"""
-        return await self.metrics.get_stats()
 
-    async def health_check(self) -> Dict[str, Any]:
-        """Health check endpoint"""
-        try:
-            # Check database
-            await self.db.files.find_one()
-            db_healthy = True
-        except Exception as e:
-            logger.error(f"Database health check failed: {e}")
-            db_healthy = False
+        etag = result.get("ETag", "").strip('"')
 
-        try:
-            # Check S3
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: s3_internal.list_objects_v2(Bucket=MINIO_BUCKET, MaxKeys=1),
-            )
-            s3_healthy = True
-        except Exception as e:
-            logger.error(f"S3 health check failed: {e}")
-            s3_healthy = False
+        await self.db.upload_manifests.update_one(
+            {"file_id": manifest["file_id"]},
+            {
+                "$set": {
+                    "status": "completed",
+                    "etag": etag,
+                    "updated_at": datetime.utcnow(),
+                }
+            },
+        )
 
         return {
-            "status": "healthy" if (db_healthy and s3_healthy) else "degraded",
-            "database": "healthy" if db_healthy else "unhealthy",
-            "storage": "healthy" if s3_healthy else "unhealthy",
-            "circuit_breaker_state": self.circuit_breaker.state,
-            "timestamp": datetime.utcnow().isoformat(),
+            "success": True,
+            "file_id": manifest["file_id"],
+            "storage_key": manifest["storage_key"],
+            "etag": etag,
         }
 
-    async def list_session_files_user(
-        self,
+    async def abort_multipart(
+        self, payload: Dict[str, Any], session: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Abort an in-flight multipart upload so its parts stop using storage"""
+        manifest = await self._get_manifest(payload["file_id"], session)
+
+        try:
+            s3_internal = await get_s3_internal()
+            await s3_internal.abort_multipart_upload(
+                Bucket=MINIO_BUCKET,
+                Key=manifest["storage_key"],
+                UploadId=manifest["upload_id"],
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchUpload":
+                raise
+
+        await self.db.upload_manifests.update_one(
+            {"file_id": manifest["file_id"], "status": "in_progress"},
+            {"$set": {"status": "aborted", "updated_at": datetime.utcnow()}},
+        )
+
+        return {"success": True, "file_id": manifest["file_id"], "aborted": True}
+
+    # ---------- server-proxied streaming upload ----------
+
+    async def stream_upload(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        content_type: Optional[str],
+        declared_size: Optional[int],
+        session: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Pipe a request body into storage for clients that can't reach it directly.
+
+        The body is cut into CHUNK_SIZE parts of a multipart upload with at
+        most STREAM_PARTS_IN_FLIGHT of them uploading at once, so memory stays
+        at a few parts whatever the file size. The sha256 and the sniffed type
+        are computed on the way through; nothing is written to disk.
+        """
+        start_time = time.time()
+
+        if not session or not session.get("sharing_session_ID"):
+            raise HTTPException(status_code=401, detail="Invalid session")
+
+        rate_key = f"{session['sender_ID']}:{session['sharing_session_ID']}"
+        if not await self.rate_limiter.acquire(rate_key):
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please wait before uploading more files.",
+            )
+
+        try:
+            safe_name = FileValidator.validate_filename(filename)
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if declared_size is not None:
+            if declared_size > self.MAX_FILE_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File exceeds {self.MAX_FILE_SIZE / 1024 / 1024}MB limit",
+                )
+            try:
+                await self.quota_manager.check_quota(
+                    user_id=session["sender_ID"],
+                    session_id=session["sharing_session_ID"],
+                    size=declared_size,
+                )
+            except QuotaExceededError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        file_id = str(uuid4())
+        storage_key = f"{session['sharing_session_ID']}/{file_id}_{safe_name}"
+        s3_internal = await get_s3_internal()
+
+        # Recorded before any byte is stored: the storage event ingest skips
+        # stream uploads, since only this request knows the hash and the
+        # sniffed type (and whether the object is a duplicate to drop)
+        await self.db.upload_manifests.insert_one(
+            {
+                "file_id": file_id,
+                "storage_key": storage_key,
+                "sharing_session_id": session["sharing_session_ID"],
+                "filename": safe_name,
+                "content_type": content_type,
+                "upload_mode": "stream",
+                "status": "in_progress",
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+            }
+        )
+
+        sha256 = hashlib.sha256()
+        head = bytearray()
+        buffer = bytearray()
+        sniff_task = None
+        size = 0
+        upload_id = None
+        part_number = 0
+        parts = []
+        in_flight = set()
+
+        async def _drain(limit: int):
+            nonlocal in_flight
+            while len(in_flight) > limit:
+                done, in_flight = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    parts.append(task.result())
+
+        async def _ship(body: bytes):
+            nonlocal upload_id, part_number
+            if upload_id is None:
+                params = {"Bucket": MINIO_BUCKET, "Key": storage_key}
+                if content_type:
+                    params["ContentType"] = content_type
+                upload = await s3_internal.create_multipart_upload(**params)
+                upload_id = upload["UploadId"]
+
+            # Backpressure: stop reading the body while the part slots are full
+            await _drain(self.STREAM_PARTS_IN_FLIGHT - 1)
+            part_number += 1
+            in_flight.add(
+                asyncio.create_task(
+                    self._upload_stream_part(storage_key, upload_id, part_number, body)
+                )
+            )
+
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > (declared_size or self.MAX_FILE_SIZE):
+                    raise HTTPException(
+                        status_code=413, detail="Upload exceeds its declared size"
+                    )
+
+                sha256.update(chunk)
+                if sniff_task is None:
+                    head.extend(chunk[: SNIFF_BYTES - len(head)])
+                    if len(head) >= SNIFF_BYTES:
+                        sniff_task = asyncio.create_task(detect_mime(bytes(head)))
+
+                buffer.extend(chunk)
+                while len(buffer) >= self.CHUNK_SIZE:
+                    await _ship(bytes(buffer[: self.CHUNK_SIZE]))
+                    del buffer[: self.CHUNK_SIZE]
+
+            if size == 0:
+                raise HTTPException(status_code=400, detail=f"{safe_name} is empty")
+
+            if declared_size is not None and size != declared_size:
+                raise HTTPException(status_code=400, detail="Upload was truncated")
+
+            if upload_id is None:
+                # Smaller than one part: a plain PUT is one round trip
+                params = {"Bucket": MINIO_BUCKET, "Key": storage_key}
+                if content_type:
+                    params["ContentType"] = content_type
+                result = await s3_internal.put_object(Body=bytes(buffer), **params)
+            else:
+                if buffer:
+                    await _ship(bytes(buffer))
+                buffer.clear()
+                await _drain(0)
+                result = await s3_internal.complete_multipart_upload(
+                    Bucket=MINIO_BUCKET,
+                    Key=storage_key,
+                    UploadId=upload_id,
+                    MultipartUpload={
+                        "Parts": sorted(parts, key=lambda p: p["PartNumber"])
+                    },
+                )
+
+            detected = await (sniff_task or detect_mime(bytes(head)))
+
+        except (Exception, asyncio.CancelledError) as e:
+            for task in in_flight:
+                task.cancel()
+            if sniff_task is not None:
+                sniff_task.cancel()
+            if upload_id is not None:
+                try:
+                    await s3_internal.abort_multipart_upload(
+                        Bucket=MINIO_BUCKET, Key=storage_key, UploadId=upload_id
+                    )
+                except ClientError as abort_error:
+                    logger.warning(
+                        f"Failed to abort stream upload {file_id}: {abort_error}"
+                    )
+
+            await self._finish_stream_manifest(file_id, "aborted")
+
+            if isinstance(e, (ClientError, BotoCoreError)):
+                logger.error(f"Stream upload failed for {file_id}: {e}")
+                await self.metrics.record_error()
+                raise HTTPException(status_code=502, detail="Storage upload failed")
+            raise
+
+        sha256_hex = sha256.hexdigest()
+        file_info = {
+            "file_id": file_id,
+            "storage_key": storage_key,
+            "filename": safe_name,
+            "content_type": content_type,
+        }
+        upload_mode = "stream"
+
+        # The hash is only known now, so deduplication happens after the fact
+        blob = (await self._find_blobs([sha256_hex], session["sender_ID"])).get(
+            sha256_hex
+        )
+        if blob and blob["size"] == size:
+            blob_key = self._blob_key(sha256_hex)
+            await touch_refs([blob_key])
+            await self._cleanup_storage(storage_key)
+            file_info.update({"storage_key": blob_key, "sha256": sha256_hex})
+            upload_mode = "deduplicated"
+
+        if declared_size is None:
+            try:
+                await self.quota_manager.check_quota(
+                    user_id=session["sender_ID"],
+                    session_id=session["sharing_session_ID"],
+                    size=size,
+                )
+            except QuotaExceededError as e:
+                await self._cleanup_storage(file_info["storage_key"])
+                await self._finish_stream_manifest(file_id, "aborted")
+                raise HTTPException(status_code=400, detail=str(e))
+
+        doc = self._build_document(
+            file_info, session, size=size, etag=result.get("ETag", "")
+        )
+        doc["checksum_sha256"] = sha256_hex
+        # Sniffed while streaming, so the upload needs no background inspection
+        doc.update(self._inspection_result(doc, detected))
+
+        try:
+            await self._save_documents_batch([doc])
+        except Exception as e:
+            logger.error(f"Database save failed: {e}", exc_info=True)
+            await self._cleanup_storage(file_info["storage_key"])
+            await self._finish_stream_manifest(file_id, "aborted")
+            raise HTTPException(status_code=500, detail="Failed to save file metadata")
+
+        await self._finish_stream_manifest(file_id, "completed")
+
+        await self.quota_manager.increment_usage(
+            user_id=session["sender_ID"],
+            session_id=session["sharing_session_ID"],
+            size=size,
+        )
+        await self.metrics.record_upload(size, time.time() - start_time)
+
+        if doc.get("preview_status") == "pending":
+            self._run_in_background(self.generate_previews([doc]))
+
+        logger.info(
+            f"Stream upload {file_id}: {size / 1024 / 1024:.2f}MB in "
+            f"{part_number or 1} part(s), {time.time() - start_time:.2f}s"
+        )
+
+        return {
+            "success": True,
+            "file_id": file_id,
+            "filename": safe_name,
+            "storage_key": doc["storage_key"],
+            "size": size,
+            "sha256": sha256_hex,
+            "detected_mime": detected,
+            "inspection_status": doc["inspection_status"],
+            "upload_mode": upload_mode,
+        }
+
+    # ---------- small-file packs ----------
+
+    async def init_pack(
+        self, files: List[Any], session: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Lay small files out back to back in one pack object and sign its PUT.
+
+        The client uploads the concatenation with a single request; every
+        file's offset is fixed here and stored in the pack manifest.
+        """
+        if not session or not session.get("sharing_session_ID"):
+            raise HTTPException(status_code=401, detail="Invalid session")
+
+        rate_key = f"{session['sender_ID']}:{session['sharing_session_ID']}"
+        if not await self.rate_limiter.acquire(rate_key):
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please wait before uploading more files.",
+            )
+
+        if len(files) > self.PACK_MAX_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Maximum {self.PACK_MAX_FILES} files allowed per pack",
+            )
+
+        total_size = sum(f.size for f in files)
+        if total_size > self.PACK_MAX_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Pack exceeds {self.PACK_MAX_SIZE / 1024 / 1024:.0f}MB",
+            )
+
+        members = []
+        offset = 0
+        try:
+            for f in files:
+                if f.size > self.PACK_MAX_FILE_SIZE:
+                    raise ValidationError(
+                        f"{f.filename} is too large to pack; upload it separately"
+                    )
+                members.append(
+                    {
+                        "file_id": str(uuid4()),
+                        "filename": FileValidator.validate_filename(f.filename),
+                        "content_type": f.content_type,
+                        "offset": offset,
+                        "size": f.size,
+                    }
+                )
+                offset += f.size
+
+            await self.quota_manager.check_quota(
+                user_id=session["sender_ID"],
+                session_id=session["sharing_session_ID"],
+                size=total_size,
+            )
+        except (ValidationError, QuotaExceededError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        pack_id = str(uuid4())
+        storage_key = f"{session['sharing_session_ID']}/packs/{pack_id}"
+
+        await self.db.pack_manifests.insert_one(
+            {
+                "pack_id": pack_id,
+                "storage_key": storage_key,
+                "sharing_session_id": session["sharing_session_ID"],
+                "size": total_size,
+                "files": members,
+                "status": "in_progress",
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+            }
+        )
+
+        return {
+            "pack_id": pack_id,
+            "storage_key": storage_key,
+            "size": total_size,
+            "upload_url": public_presigner.presign(
+                "PUT", storage_key, self.PACK_URL_EXPIRES
+            ),
+            "expires_in": self.PACK_URL_EXPIRES,
+            "files": members,
+        }
+
+    async def complete_pack(
+        self, pack_id: str, session: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Check the pack object once and record a files document per member"""
+        if not session or not session.get("sharing_session_ID"):
+            raise HTTPException(status_code=401, detail="Invalid session")
+
+        manifest = await self.db.pack_manifests.find_one(
+            {
+                "pack_id": pack_id,
+                "sharing_session_id": session["sharing_session_ID"],
+            }
+        )
+        if not manifest:
+            raise HTTPException(status_code=404, detail="Pack not found")
+
+        if manifest["status"] == "completed":
+            return {
+                "success": True,
+                "pack_id": pack_id,
+                "files_saved": 0,
+                "total_size": manifest["size"],
+            }
+
+        try:
+            s3_internal = await get_s3_internal()
+            metadata = await s3_internal.head_object(
+                Bucket=MINIO_BUCKET, Key=manifest["storage_key"]
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                raise HTTPException(status_code=409, detail="Pack not uploaded yet")
+            raise
+
+        if metadata.get("ContentLength") != manifest["size"]:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Pack is {metadata.get('ContentLength')} bytes, "
+                    f"expected {manifest['size']}"
+                ),
+            )
+
+        try:
+            await self.quota_manager.check_quota(
+                user_id=session["sender_ID"],
+                session_id=session["sharing_session_ID"],
+                size=manifest["size"],
+            )
+        except QuotaExceededError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        etag = metadata.get("ETag", "")
+        docs = []
+        for member in manifest["files"]:
+            doc = self._build_document(
+                {**member, "storage_key": manifest["storage_key"]},
+                session,
+                size=member["size"],
+                etag=etag,
+            )
+            doc.update({"pack_id": pack_id, "pack_offset": member["offset"]})
+            docs.append(doc)
+
+        saved_count = await self._save_documents_batch(docs)
+        self.schedule_inspection(docs)
+
+        await self.quota_manager.increment_usage(
+            user_id=session["sender_ID"],
+            session_id=session["sharing_session_ID"],
+            size=manifest["size"],
+        )
+        await self.metrics.record_upload(manifest["size"], 0.0)
+
+        await self.db.pack_manifests.update_one(
+            {"pack_id": pack_id},
+            {"$set": {"status": "completed", "updated_at": datetime.utcnow()}},
+        )
+
+        return {
+            "success": True,
+            "pack_id": pack_id,
+            "files_saved": saved_count,
+            "total_size": manifest["size"],
+        }
+
+    @staticmethod
+    def byte_range(doc: Dict[str, Any]) -> Optional[str]:
+        """Range header selecting a packed file inside its pack; None otherwise"""
+        if doc.get("pack_offset") is None:
+            return None
+        start = doc["pack_offset"]
+        return f"bytes={start}-{start + doc['size'] - 1}"
+
+    @async_retry(max_attempts=3, delay=0.5, exceptions=(ClientError, BotoCoreError))
+    async def _finish_stream_manifest(self, file_id: str, status: str) -> None:
+        await self.db.upload_manifests.update_one(
+            {"file_id": file_id},
+            {"$set": {"status": status, "updated_at": datetime.utcnow()}},
+        )
+
+    async def _upload_stream_part(
+        self, storage_key: str, upload_id: str, part_number: int, body: bytes
+    ) -> Dict[str, Any]:
+        s3_internal = await get_s3_internal()
+        result = await s3_internal.upload_part(
+            Bucket=MINIO_BUCKET,
+            Key=storage_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": result["ETag"]}
+
+    async def complete_upload(
+        self, files: List[Dict[str, Any]], session: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        start_time = time.time()
+
+        try:
+            if not session or not session.get("sharing_session_ID"):
+                raise HTTPException(status_code=401, detail="Invalid session")
+
+            if not files:
+                raise HTTPException(status_code=400, detail="No files provided")
+
+            # Files already recorded from a bucket notification need no storage reads
+            recorded = await self.db.files.find(
+                {
+                    "file_id": {"$in": [f["file_id"] for f in files]},
+                    "sharing_session_id": session["sharing_session_ID"],
+                },
+                {"_id": 0, "file_id": 1, "size": 1},
+            ).to_list(length=len(files))
+            recorded_ids = {doc["file_id"] for doc in recorded}
+
+            pending = [f for f in files if f["file_id"] not in recorded_ids]
+            results = await self._verify_batch(pending, session) if pending else []
+
+            successful_docs = []
+            failed_files = []
+            total_size = 0
+
+            for i, result in enumerate(results):
+                if isinstance(result, Exception):
+                    failed_files.append(
+                        {"file_id": pending[i].get("file_id"), "error": str(result)}
+                    )
+                    await self.metrics.record_error()
+                else:
+                    successful_docs.append(result)
+                    total_size += result["size"]
+
+            if successful_docs:
+                # POST-policy uploads skip init_upload, so quota is enforced here too
+                try:
+                    await self.quota_manager.check_quota(
+                        user_id=session["sender_ID"],
+                        session_id=session["sharing_session_ID"],
+                        size=total_size,
+                    )
+                except QuotaExceededError as e:
+                    await asyncio.gather(
+                        *[
+                            self._cleanup_storage(doc["storage_key"])
+                            for doc in successful_docs
+                        ],
+                        return_exceptions=True,
+                    )
+                    raise HTTPException(status_code=400, detail=str(e))
+
+            saved_count = 0
+            if successful_docs:
+                try:
+                    saved_count = await self._save_documents_batch(successful_docs)
+                    self.schedule_inspection(successful_docs)
+
+                    await self.quota_manager.increment_usage(
+                        user_id=session["sender_ID"],
+                        session_id=session["sharing_session_ID"],
+                        size=total_size,
+                    )
+
+                    duration = time.time() - start_time
+                    await self.metrics.record_upload(total_size, duration)
+
+                except Exception as e:
+                    logger.error(f"Database save failed: {e}", exc_info=True)
+                    cleanup_tasks = [
+                        self._cleanup_storage(doc["storage_key"])
+                        for doc in successful_docs
+                    ]
+                    await asyncio.gather(*cleanup_tasks, return_exceptions=True)
+                    raise HTTPException(
+                        status_code=500, detail="Failed to save file metadata"
+                    )
+
+            duration = time.time() - start_time
+            logger.info(
+                f"Upload completion finished in {duration:.2f}s. "
+                f"Saved: {saved_count}, Failed: {len(failed_files)}, "
+                f"Total size: {total_size / 1024 / 1024:.2f}MB"
+            )
+
+            response = {
+                "success": True,
+                "files_saved": saved_count + len(recorded),
+                "total_size": total_size + sum(doc["size"] for doc in recorded),
+            }
+
+            if failed_files:
+                response["failed_files"] = failed_files
+
+            print("complete upload response = ", response)
+
+            return response
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            await self.metrics.record_error()
+            logger.error(f"Upload completion failed: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail="Failed to complete upload")
+
+    @async_retry(max_attempts=3, delay=0.5, exceptions=(ClientError, BotoCoreError))
+    async def _verify_and_prepare_document(
+        self,
+        file_info: Dict[str, Any],
+        session: Dict[str, Any],
+        not_before: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+
+        async def _verify():
+            s3_internal = await get_s3_internal()
+            try:
+                metadata = await s3_internal.head_object(
+                    Bucket=MINIO_BUCKET,
+                    Key=file_info["storage_key"],
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "404":
+                    raise StorageError(
+                        f"File {file_info['storage_key']} not found in storage"
+                    )
+                raise
+
+            # LastModified has second precision and is always timezone-aware
+            if not_before is not None and metadata["LastModified"].astimezone(
+                timezone.utc
+            ).replace(tzinfo=None) < not_before.replace(microsecond=0):
+                raise StorageError(
+                    f"File {file_info['storage_key']} was not uploaded for this file"
+                )
+
+            return self._build_document(
+                file_info,
+                session,
+                size=metadata.get("ContentLength", file_info.get("size", 0)),
+                etag=metadata.get("ETag", ""),
+            )
+
+        return await self.circuit_breaker.call(_verify)
+
+    @staticmethod
+    def _build_document(
+        file_info: Dict[str, Any], session: Dict[str, Any], size: int, etag: str
+    ) -> Dict[str, Any]:
+        doc = {
+            "file_id": file_info["file_id"],
+            "sharing_session_id": session["sharing_session_ID"],
+            "sender_ID": session["sender_ID"],
+            "sender_type": session["sender_type"],
+            "storage_key": file_info["storage_key"],
+            "size": size,
+            "mime_type": file_info.get("content_type"),
+            "filename": file_info.get("filename"),
+            "etag": etag.strip('"'),
+            "inspection_status": "pending",
+            "is_deleted": False,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }
+
+        if file_info.get("sha256"):
+            doc["content_sha256"] = file_info["sha256"]
+
+        return doc
+
+    async def _list_session_objects(
+        self, prefix: str, keys: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """List only the slice of `prefix` spanning `keys` (paginated list_objects_v2)"""
+        first_key, last_key = min(keys), max(keys)
+        s3_internal = await get_s3_internal()
+        paginator = s3_internal.get_paginator("list_objects_v2")
+        listing = {}
+
+        # StartAfter is exclusive, so start just before the smallest key
+        async for page in paginator.paginate(
+            Bucket=MINIO_BUCKET, Prefix=prefix, StartAfter=first_key[:-1]
+        ):
+            for obj in page.get("Contents", []):
+                if obj["Key"] > last_key:
+                    return listing
+                listing[obj["Key"]] = obj
+
+        return listing
+
+    async def _verify_batch(
+        self, files: List[Dict[str, Any]], session: Dict[str, Any]
+    ) -> List[Any]:
+        """Verify a completion batch with one prefix listing instead of a HEAD per file.
+
+        Returns one document or exception per input file, like gather(..., return_exceptions=True).
+        Keys missing from the listing fall back to HEAD.
+        """
+        prefix = f"{session['sharing_session_ID']}/"
+        results = [None] * len(files)
+
+        # Keys are chosen by the client in POST-policy mode, so only accept
+        # `{session}/{file_id}_...` (or the file's own content-addressed key)
+        # and never another session's objects.
+        for i, file_info in enumerate(files):
+            if file_info.get("sha256"):
+                owned = file_info["storage_key"] == self._blob_key(file_info["sha256"])
+            else:
+                owned = file_info["storage_key"].startswith(
+                    f"{prefix}{file_info['file_id']}_"
+                )
+
+            if not owned:
+                results[i] = ValidationError(
+                    f"Storage key {file_info['storage_key']} does not belong to this session"
+                )
+
+        # The sender's own blobs were verified when first uploaded
+        hashed = [
+            i for i, f in enumerate(files) if results[i] is None and f.get("sha256")
+        ]
+        blobs = await self._find_blobs(
+            [files[i]["sha256"] for i in hashed], session["sender_ID"]
+        )
+        for i in hashed:
+            blob = blobs.get(files[i]["sha256"])
+            if blob:
+                results[i] = self._build_document(
+                    files[i], session, size=blob["size"], etag=blob.get("etag", "")
+                )
+
+        # Any other blob is only accepted once the checksum-signed PUT issued
+        # for this file has (re)written it, so a known hash alone gets nothing
+        hashed = [i for i in hashed if results[i] is None]
+        signed = {}
+        if hashed:
+            signed = {
+                doc["file_id"]: doc
+                for doc in await self.db.blob_uploads.find(
+                    {
+                        "file_id": {"$in": [files[i]["file_id"] for i in hashed]},
+                        "sender_ID": session["sender_ID"],
+                    }
+                ).to_list(length=len(hashed))
+            }
+        for i in hashed:
+            upload = signed.get(files[i]["file_id"])
+            if not upload or upload["storage_key"] != files[i]["storage_key"]:
+                results[i] = ValidationError(
+                    f"No upload was signed for {files[i]['storage_key']}"
+                )
+
+        keys = [
+            f["storage_key"]
+            for i, f in enumerate(files)
+            if results[i] is None and f["storage_key"].startswith(prefix)
+        ]
+        listing = {}
+
+        if keys:
+            try:
+                listing = await self.circuit_breaker.call(
+                    self._list_session_objects, prefix, keys
+                )
+            except Exception as e:
+                logger.warning(f"Batch listing failed, falling back to HEAD: {e}")
+
+        misses = []
+
+        for i, file_info in enumerate(files):
+            if results[i] is not None:
+                continue
+
+            obj = listing.get(file_info["storage_key"])
+            if obj:
+                results[i] = self._build_document(
+                    file_info, session, size=obj["Size"], etag=obj.get("ETag", "")
+                )
+            else:
+                misses.append(i)
+
+        if misses:
+            fallback = await asyncio.gather(
+                *[
+                    self._verify_and_prepare_document(
+                        files[i],
+                        session,
+                        not_before=signed.get(files[i]["file_id"], {}).get(
+                            "created_at"
+                        ),
+                    )
+                    for i in misses
+                ],
+                return_exceptions=True,
+            )
+            for i, result in zip(misses, fallback):
+                results[i] = result
+
+        return results
+
+    async def _save_documents_batch(self, docs: List[Dict[str, Any]]) -> int:
+        """Save documents to database with batching.
+
+        Upserts on file_id, so complete_upload and the storage event ingest can
+        both record the same upload; returns how many documents were new.
+        """
+        if not docs:
+            return 0
+
+        BATCH_SIZE = 100
+        saved_count = 0
+
+        await apply_retention(docs)
+
+        for i in range(0, len(docs), BATCH_SIZE):
+            batch = docs[i : i + BATCH_SIZE]
+            ops = [
+                UpdateOne({"file_id": doc["file_id"]}, {"$setOnInsert": doc}, upsert=True)
+                for doc in batch
+            ]
+            try:
+                result = await self.db.files.bulk_write(ops, ordered=False)
+                inserted = list(result.upserted_ids)
+            except BulkWriteError as e:
+                # A concurrent upsert of the same file_id loses on the unique index
+                inserted = [u["index"] for u in e.details.get("upserted", [])]
+                for error in e.details.get("writeErrors", []):
+                    if error.get("code") != 11000:
+                        logger.error(
+                            f"Failed to save document "
+                            f"{batch[error['index']]['file_id']}: {error.get('errmsg')}"
+                        )
+
+            saved_count += len(inserted)
+            await add_refs(batch[index]["storage_key"] for index in inserted)
+            await add_live_files(batch[index] for index in inserted)
+
+        return saved_count
+
+    @staticmethod
+    def verify_storage_event_token(authorization: Optional[str]) -> None:
+        """Check the bearer token MinIO sends with each webhook notification"""
+        if not MINIO_WEBHOOK_TOKEN:
+            raise HTTPException(
+                status_code=503, detail="Storage event ingest is not configured"
+            )
+
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(
+            token.encode(), MINIO_WEBHOOK_TOKEN.encode()
+        ):
+            raise HTTPException(status_code=401, detail="Invalid storage event token")
+
+    async def ingest_storage_event(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Record uploads from a MinIO `s3:ObjectCreated:*` bucket notification.
+
+        Size and ETag come from the event itself, so nothing is read back from
+        storage and uploads are recorded even if the client never calls
+        complete_upload. Only keys of the form `{session}/{file_id}_{name}`
+        are accepted; anything else in the bucket is ignored.
+        """
+        uploads = []
+        skipped = 0
+
+        for record in event.get("Records") or []:
+            s3_info = record.get("s3") or {}
+            obj = s3_info.get("object") or {}
+
+            if (
+                "ObjectCreated:" not in record.get("eventName", "")
+                or (s3_info.get("bucket") or {}).get("name") != MINIO_BUCKET
+            ):
+                skipped += 1
+                continue
+
+            storage_key = unquote_plus(obj.get("key", ""))
+            session_id, _, object_name = storage_key.partition("/")
+            file_id, sep, filename = object_name.partition("_")
+
+            if (
+                not session_id
+                or not sep
+                or not file_id
+                or "/" in object_name
+                or storage_key.endswith(THUMBNAIL_SUFFIX)
+            ):
+                skipped += 1
+                continue
+
+            uploads.append(
+                {
+                    "file_id": file_id,
+                    "storage_key": storage_key,
+                    "session_id": session_id,
+                    "filename": filename,
+                    "content_type": obj.get("contentType"),
+                    "size": int(obj.get("size", 0)),
+                    "etag": obj.get("eTag", ""),
+                }
+            )
+
+        if not uploads:
+            return {"success": True, "files_saved": 0, "skipped": skipped}
+
+        file_ids = [u["file_id"] for u in uploads]
+        session_ids = list({u["session_id"] for u in uploads})
+
+        recorded = await self.db.files.distinct("file_id", {"file_id": {"$in": file_ids}})
+        sessions = {
+            s["sharing_session_ID"]: s
+            for s in await self.db.sharing_session.find(
+                {"sharing_session_ID": {"$in": session_ids}}
+            ).to_list(length=len(session_ids))
+        }
+        # Multipart uploads keep the original filename and type in their manifest
+        manifests = {
+            m["file_id"]: m
+            for m in await self.db.upload_manifests.find(
+                {"file_id": {"$in": file_ids}},
+                {
+                    "_id": 0,
+                    "file_id": 1,
+                    "filename": 1,
+                    "content_type": 1,
+                    "upload_mode": 1,
+                },
+            ).to_list(length=len(file_ids))
+        }
+
+        docs_by_session = defaultdict(list)
+        for upload in uploads:
+            session = sessions.get(upload["session_id"])
+            manifest = manifests.get(upload["file_id"], {})
+            if (
+                upload["file_id"] in recorded
+                or session is None
+                # Proxied stream uploads are recorded (or dropped) by stream_upload
+                or manifest.get("upload_mode") == "stream"
+            ):
+                skipped += 1
+                continue
+
+            upload["filename"] = manifest.get("filename", upload["filename"])
+            upload["content_type"] = manifest.get(
+                "content_type", upload["content_type"]
+            )
+
+            docs_by_session[upload["session_id"]].append(
+                self._build_document(
+                    upload, session, size=upload["size"], etag=upload["etag"]
+                )
+            )
+
+        docs = []
+        for session_id, session_docs in docs_by_session.items():
+            session = sessions[session_id]
+            try:
+                await self.quota_manager.check_quota(
+                    user_id=session["sender_ID"],
+                    session_id=session_id,
+                    size=sum(doc["size"] for doc in session_docs),
+                )
+            except QuotaExceededError as e:
+                logger.warning(f"Dropping uploads for session {session_id}: {e}")
+                await asyncio.gather(
+                    *[self._cleanup_storage(doc["storage_key"]) for doc in session_docs],
+                    return_exceptions=True,
+                )
+                skipped += len(session_docs)
+                continue
+
+            docs.extend(session_docs)
+
+        saved_count = await self._save_documents_batch(docs)
+        self.schedule_inspection(docs)
+        if saved_count:
+            await self.metrics.record_upload(sum(doc["size"] for doc in docs), 0.0)
+
+        logger.info(
+            f"Storage event ingest: saved={saved_count}, skipped={skipped}"
+        )
+
+        return {"success": True, "files_saved": saved_count, "skipped": skipped}
+
+    def schedule_inspection(self, docs: List[Dict[str, Any]]) -> None:
+        """Sniff freshly saved uploads in the background; lifecycle retries misses"""
+        if not docs:
+            return
+
+        self._run_in_background(self.inspect_files(docs))
+
+    def _run_in_background(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def inspect_files(self, docs: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Sniff each object's first bytes, record detected_mime, quarantine mismatches"""
+        semaphore = asyncio.Semaphore(self.INSPECTION_CONCURRENCY)
+        summary = {"clean": 0, "quarantined": 0, "failed": 0}
+        previewable = []
+
+        async def _inspect(doc: Dict[str, Any]) -> UpdateOne:
+            async with semaphore:
+                try:
+                    detected = await sniff_object(doc["storage_key"], doc.get("size"))
+                except Exception as e:
+                    logger.warning(f"Inspection failed for {doc['file_id']}: {e}")
+                    summary["failed"] += 1
+                    return UpdateOne(
+                        {"file_id": doc["file_id"]},
+                        {"$inc": {"inspection_attempts": 1}},
+                    )
+
+            update = self._inspection_result(doc, detected)
+            summary[update["inspection_status"]] += 1
+            if update.get("preview_status") == "pending":
+                previewable.append({**doc, **update})
+
+            return UpdateOne({"file_id": doc["file_id"]}, {"$set": update})
+
+        async def _inspect_pack(storage_key: str, members: List[Dict[str, Any]]):
+            # One GET per pack instead of one per packed file
+            async with semaphore:
+                try:
+                    detected = await sniff_pack(
+                        storage_key,
+                        [(m["file_id"], m["pack_offset"], m["size"]) for m in members],
+                    )
+                except Exception as e:
+                    logger.warning(f"Inspection failed for pack {storage_key}: {e}")
+                    summary["failed"] += len(members)
+                    return [
+                        UpdateOne(
+                            {"file_id": m["file_id"]},
+                            {"$inc": {"inspection_attempts": 1}},
+                        )
+                        for m in members
+                    ]
+
+            ops = []
+            for m in members:
+                update = self._inspection_result(m, detected[m["file_id"]])
+                summary[update["inspection_status"]] += 1
+                ops.append(UpdateOne({"file_id": m["file_id"]}, {"$set": update}))
+            return ops
+
+        packs = defaultdict(list)
+        for doc in docs:
+            if doc.get("pack_offset") is not None:
+                packs[doc["storage_key"]].append(doc)
+
+        ops = await asyncio.gather(
+            *[_inspect(doc) for doc in docs if doc.get("pack_offset") is None]
+        )
+        for pack_ops in await asyncio.gather(
+            *[_inspect_pack(key, members) for key, members in packs.items()]
+        ):
+            ops.extend(pack_ops)
+
+        if ops:
+            await self.db.files.bulk_write(ops, ordered=False)
+
+        if previewable:
+            await self.generate_previews(previewable)
+
+        return summary
+
+    async def inspect_pending(self, older_than: timedelta, limit: int = 1000) -> int:
+        """Inspect uploads whose background inspection never happened or failed"""
+        docs = await self.db.files.find(
+            {
+                "inspection_status": "pending",
+                "created_at": {"$lte": datetime.utcnow() - older_than},
+                "inspection_attempts": {"$not": {"$gte": self.INSPECTION_MAX_ATTEMPTS}},
+            },
+            {
+                "_id": 0,
+                "file_id": 1,
+                "storage_key": 1,
+                "size": 1,
+                "mime_type": 1,
+                "pack_offset": 1,
+            },
+        ).to_list(length=limit)
+
+        if docs:
+            await self.inspect_files(docs)
+
+        return len(docs)
+
+    def _inspection_result(
+        self, doc: Dict[str, Any], detected: str
+    ) -> Dict[str, Any]:
+        """Fields recording a sniff result: quarantine on mismatch, else queue a preview"""
+        reason = FileValidator.mime_mismatch(doc.get("mime_type"), detected)
+        update = {
+            "detected_mime": detected,
+            "inspection_status": "quarantined" if reason else "clean",
+            "inspected_at": datetime.utcnow(),
+        }
+        if reason:
+            update.update({"quarantined": True, "quarantine_reason": reason})
+            logger.warning(f"Quarantined {doc['file_id']}: {reason}")
+        elif doc.get("pack_offset") is None and self._is_previewable(
+            detected, doc.get("size")
+        ):
+            # Packed files share one key, which thumbnail keys are derived from
+            update["preview_status"] = "pending"
+
+        return update
+
+    def _is_previewable(self, detected_mime: Optional[str], size: Optional[int]) -> bool:
+        return (
+            detected_mime in PREVIEWABLE_MIME_TYPES
+            and 0 < (size or 0) <= self.PREVIEW_MAX_SOURCE_SIZE
+        )
+
+    async def generate_previews(self, docs: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Render a WebP thumbnail per distinct object and store it next to it.
+
+        Copies and deduplicated uploads share one storage key, so each key is
+        rendered once and every document pointing at it gets `thumbnail_key`.
+        """
+        semaphore = asyncio.Semaphore(self.PREVIEW_CONCURRENCY)
+        summary = {"ready": 0, "failed": 0}
+
+        by_key = {}
+        for doc in docs:
+            by_key.setdefault(doc["storage_key"], doc)
+
+        existing = set(
+            await self.db.files.distinct(
+                "storage_key",
+                {
+                    "storage_key": {"$in": list(by_key)},
+                    "preview_status": "ready",
+                },
+            )
+        )
+
+        async def _render(storage_key: str, doc: Dict[str, Any]) -> UpdateMany:
+            thumb_key = thumbnail_key(storage_key)
+            match = {"storage_key": storage_key, "preview_status": "pending"}
+
+            if storage_key not in existing:
+                async with semaphore:
+                    try:
+                        s3_internal = await get_s3_internal()
+                        obj = await s3_internal.get_object(
+                            Bucket=MINIO_BUCKET, Key=storage_key
+                        )
+                        async with obj["Body"] as body:
+                            data = await body.read()
+
+                        thumbnail = await generate_thumbnail(
+                            data, doc["detected_mime"]
+                        )
+
+                        await s3_internal.put_object(
+                            Bucket=MINIO_BUCKET,
+                            Key=thumb_key,
+                            Body=thumbnail,
+                            ContentType="image/webp",
+                            CacheControl="private, max-age=86400",
+                        )
+                    except (ClientError, BotoCoreError) as e:
+                        # Storage hiccup: lifecycle retries until PREVIEW_MAX_ATTEMPTS
+                        logger.warning(f"Preview fetch failed for {storage_key}: {e}")
+                        summary["failed"] += 1
+                        return UpdateMany(match, {"$inc": {"preview_attempts": 1}})
+                    except Exception as e:
+                        # Undecodable content fails the same way every time
+                        logger.warning(f"Preview render failed for {storage_key}: {e}")
+                        summary["failed"] += 1
+                        return UpdateMany(
+                            match, {"$set": {"preview_status": "failed"}}
+                        )
+
+            summary["ready"] += 1
+            return UpdateMany(
+                match,
+                {"$set": {"preview_status": "ready", "thumbnail_key": thumb_key}},
+            )
+
+        ops = await asyncio.gather(
+            *[_render(key, doc) for key, doc in by_key.items()]
+        )
+        if ops:
+            await self.db.files.bulk_write(ops, ordered=False)
+
+        # A source released while it was rendering was freed without its
+        # thumbnail, which nothing would delete later
+        rendered = [k for k in by_key if k not in existing]
+        if rendered:
+            live = set(
+                await self.db.files.distinct(
+                    "storage_key",
+                    {
+                        "storage_key": {"$in": rendered},
+                        "storage_released": {"$ne": True},
+                    },
+                )
+            )
+            orphaned = [thumbnail_key(k) for k in rendered if k not in live]
+            for i in range(0, len(orphaned), DELETE_OBJECTS_MAX_KEYS):
+                await delete_many_from_storage(
+                    orphaned[i : i + DELETE_OBJECTS_MAX_KEYS]
+                )
+
+        return summary
+
+    async def preview_pending(self, older_than: timedelta, limit: int = 1000) -> int:
+        """Generate thumbnails whose background render never happened or failed"""
+        docs = await self.db.files.find(
+            {
+                "preview_status": "pending",
+                "is_deleted": False,
+                "inspected_at": {"$lte": datetime.utcnow() - older_than},
+                "preview_attempts": {"$not": {"$gte": self.PREVIEW_MAX_ATTEMPTS}},
+            },
+            {"_id": 0, "file_id": 1, "storage_key": 1, "detected_mime": 1},
+        ).to_list(length=limit)
+
+        if docs:
+            await self.generate_previews(docs)
+
+        return len(docs)
+
+    @classmethod
+    def attach_thumbnail_urls(cls, files: List[Dict[str, Any]]) -> None:
+        """Sign every listed thumbnail in one batch and drop the raw derived key"""
+        with_thumbnail = [f for f in files if f.get("thumbnail_key")]
+        urls = public_presigner.presign_many(
+            "GET",
+            [(f["thumbnail_key"], None, None) for f in with_thumbnail],
+            expires=cls.PREVIEW_URL_EXPIRES,
+        )
+
+        for f, url in zip(with_thumbnail, urls):
+            f["thumbnail_url"] = url
+
+        for f in files:
+            f.pop("thumbnail_key", None)
+
+    async def restore_file(self, file_id: str, session: Dict[str, Any]) -> Dict[str, Any]:
+        """Undo a soft delete, pulling the document back from files_archive if compacted"""
+        query = {"file_id": file_id, "sharing_session_id": session["sharing_session_ID"]}
+
+        file_doc = await self.db.files.find_one(query)
+        archived = file_doc is None
+        if archived:
+            file_doc = await self.db.files_archive.find_one(query)
+
+        if not file_doc:
+            raise HTTPException(status_code=404, detail="File not found")
+
+        if file_doc["sender_ID"] != session["sender_ID"]:
+            raise HTTPException(
+                status_code=403, detail="Only file sender can restore files"
+            )
+
+        if not file_doc.get("is_deleted"):
+            return {"success": True, "file_id": file_id, "restored": False}
+
+        if file_doc.get("storage_released"):
+            raise HTTPException(
+                status_code=410, detail="File content is no longer stored"
+            )
+
+        if archived:
+            file_doc.pop("archived_at", None)
+            try:
+                await self.db.files.insert_one(file_doc)
+            except DuplicateKeyError:
+                pass
+            await self.db.files_archive.delete_one({"_id": file_doc["_id"]})
+
+        now = datetime.utcnow()
+        update = {"is_deleted": False, "updated_at": now}
+
+        # An expiry in the past would sit behind the lifecycle checkpoint
+        if not file_doc.get("expires_at") or file_doc["expires_at"] <= now:
+            probe = {**file_doc, "created_at": now}
+            await apply_retention([probe])
+            update["expires_at"] = probe["expires_at"]
+
+        result = await self.db.files.update_one(
+            {"_id": file_doc["_id"], "is_deleted": True},
+            {"$set": update, "$unset": {"deleted_at": ""}},
+        )
+        if result.modified_count:
+            await add_live_files([file_doc])
+
+        return {"success": True, "file_id": file_id, "restored": True}
+
+    async def release_storage(self, file_id: str, storage_key: str) -> bool:
+        """Drop one file's reference to its object; GC deletes it once unreferenced"""
+        result = await self.db.files.update_one(
+            {"file_id": file_id, "storage_released": {"$ne": True}},
+            {"$set": {"storage_released": True, "updated_at": datetime.utcnow()}},
+        )
+        if not result.modified_count:
+            return False
+
+        await release_refs([storage_key])
+        return True
+
+    @async_retry(max_attempts=2, delay=1.0, exceptions=(ClientError, BotoCoreError))
+    async def _cleanup_storage(self, storage_key: str) -> None:
+        """Cleanup file from storage"""
+        if storage_key.startswith(self.CONTENT_ADDRESSED_PREFIX):
+            # Blobs may be shared with other files; only GC removes them
+            return
+
+        try:
+            s3_internal = await get_s3_internal()
+            await s3_internal.delete_object(Bucket=MINIO_BUCKET, Key=storage_key)
+            logger.info(f"Cleaned up storage key: {storage_key}")
+        except Exception as e:
+            logger.error(f"Failed to cleanup {storage_key}: {e}")
+            # Don't raise - cleanup is best effort
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        """Get system metrics"""
+        return await self.metrics.get_stats()
+
+    async def health_check(self) -> Dict[str, Any]:
+        """Health check endpoint"""
+        try:
+            # Check database
+            await self.db.files.find_one()
+            db_healthy = True
+        except Exception as e:
+            logger.error(f"Database health check failed: {e}")
+            db_healthy = False
+
+        try:
+            # Check S3
+            s3_internal = await get_s3_internal()
+            await s3_internal.list_objects_v2(Bucket=MINIO_BUCKET, MaxKeys=1)
+            s3_healthy = True
+        except Exception as e:
+            logger.error(f"S3 health check failed: {e}")
+            s3_healthy = False
+
+        return {
+            "status": "healthy" if (db_healthy and s3_healthy) else "degraded",
+            "database": "healthy" if db_healthy else "unhealthy",
+            "storage": "healthy" if s3_healthy else "unhealthy",
+            "circuit_breaker_state": self.circuit_breaker.state,
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+
+    # ---------- listings ----------
+
+    def _listing_query(
+        self, query: Dict[str, Any], cursor: Optional[str]
+    ) -> Dict[str, Any]:
+        after = keyset_filter(cursor, "created_at", "file_id")
+        return {"$and": [query, after]} if after else query
+
+    async def _list_page(
+        self,
+        query: Dict[str, Any],
+        projection: Dict[str, Any],
+        cursor: Optional[str],
+        limit: int,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One keyset page, newest first, plus the token for the next one"""
+        files = (
+            await self.db.files.find(self._listing_query(query, cursor), projection)
+            .sort(self.LIST_SORT)
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        )
+        next_token = next_cursor(files, limit, "created_at", "file_id")
+        self.attach_thumbnail_urls(files)
+        return files, next_token
+
+    def _stream_listing(
+        self,
+        query: Dict[str, Any],
+        projection: Dict[str, Any],
+        cursor: Optional[str],
+        stats: Dict[str, int],
+        prefix: str = "Total",
+    ) -> StreamingResponse:
+        """Every file after `cursor` as NDJSON, read straight off the Mongo cursor.
+
+        Totals travel in headers since they are known before the first row.
+        """
+
+        async def lines():
+            rows = (
+                self.db.files.find(self._listing_query(query, cursor), projection)
+                .sort(self.LIST_SORT)
+                .batch_size(self.LIST_STREAM_BATCH)
+            )
+            batch = []
+            try:
+                async for row in rows:
+                    batch.append(row)
+                    if len(batch) >= self.LIST_STREAM_BATCH:
+                        yield self._ndjson(batch)
+                        batch = []
+
+                if batch:
+                    yield self._ndjson(batch)
+            finally:
+                await rows.close()
+
+        return StreamingResponse(
+            lines(),
+            media_type="application/x-ndjson",
+            headers={
+                f"X-{prefix}-Count": str(stats["count"]),
+                f"X-{prefix}-Size": str(stats["size"]),
+            },
+        )
+
+    @classmethod
+    def _ndjson(cls, files: List[Dict[str, Any]]) -> bytes:
+        cls.attach_thumbnail_urls(files)
+        return "".join(
+            json.dumps(f, separators=(",", ":")) + "\n" for f in files
+        ).encode()
+
+    @staticmethod
+    def _listing_totals(
+        stats: Dict[str, int], prefix: str = "total"
+    ) -> Dict[str, Any]:
+        return {
+            f"{prefix}_count": stats["count"],
+            f"{prefix}_size": stats["size"],
+            f"{prefix}_size_human": f"{stats['size'] / 1024 / 1024:.2f} MB",
+        }
+
+    async def list_session_files_user(
+        self,
         session_id,
         request,
         include_deleted,
         session,
+        cursor: Optional[str] = None,
+        limit: int = LIST_PAGE_SIZE,
+        stream: bool = False,
     ):
+        """Page (or stream) a session's files.
+
+        Totals come from file_stats, which counts live files only, so with
+        include_deleted they are labelled `live_*` rather than `total_*`.
+        """
         try:
             if session.get("sharing_session_ID") != session_id:
                 raise HTTPException(
@@ -792,26 +2563,24 @@ class FileController:
             if not include_deleted:
                 query["is_deleted"] = False
 
-            files = (
-                await self.db.files.find(query, {"_id": 0})
-                .sort("created_at", -1)
-                .to_list(length=1000)
-            )
+            stats = await get_file_stats(SESSION_SCOPE, session_id)
+            prefix = "live" if include_deleted else "total"
 
-            total_size = sum(f.get("size", 0) for f in files)
+            if stream:
+                return self._stream_listing(
+                    query, SESSION_LIST_PROJECTION, cursor, stats, prefix.title()
+                )
 
-            for f in files:
-                if f.get("created_at"):
-                    f["created_at"] = f["created_at"].isoformat()
-                if f.get("updated_at"):
-                    f["updated_at"] = f["updated_at"].isoformat()
+            files, next_token = await self._list_page(
+                query, SESSION_LIST_PROJECTION, cursor, limit
+            )
 
             return {
                 "success": True,
                 "files": files,
-                "total_count": len(files),
-                "total_size": total_size,
-                "total_size_human": f"{total_size / 1024 / 1024:.2f} MB",
+                "next_cursor": next_token,
+                "has_more": next_token is not None,
+                **self._listing_totals(stats, prefix),
             }
 
         except HTTPException:
@@ -821,13 +2590,10 @@ class FileController:
             logger.error(f"Error listing files: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail="Failed to list files")
 
-    @async_retry(max_attempts=3, delay=0.5, exceptions=(ClientError, BotoCoreError))
-    async def generate_download_url(self, user, file_id: str) -> Dict[str, Any]:
-        """Generate secure presigned download URL"""
-
+    async def _find_owned_file(self, user, file_id: str) -> Dict[str, Any]:
+        """A live, non-quarantined file owned by the user; receivers own their copies"""
         user_id = user["user_id"] if user else None
 
-        # 2️⃣ Fetch file metadata from DB
         file_doc = await self.db.files.find_one(
             {
                 "file_id": file_id,
@@ -839,30 +2605,41 @@ class FileController:
         if not file_doc:
             raise HTTPException(status_code=404, detail="File not found")
 
-        storage_key = file_doc["storage_key"]
+        if file_doc.get("quarantined"):
+            raise HTTPException(status_code=403, detail="File is quarantined")
 
-        # 3️⃣ Generate presigned GET URL (run sync in executor)
-        loop = asyncio.get_event_loop()
+        return file_doc
 
-        def _generate():
-            return s3_public.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": MINIO_BUCKET,
-                    "Key": storage_key,
-                    "ResponseContentDisposition": "inline",
-                },
-                ExpiresIn=600,
-            )
+    async def generate_download_url(self, user, file_id: str) -> Dict[str, Any]:
+        """Generate secure presigned download URL"""
 
-        try:
+        # 2️⃣ Fetch file metadata from DB
+        file_doc = await self._find_owned_file(user, file_id)
 
-            async def wrapped():
-                return await loop.run_in_executor(None, _generate)
+        storage_key = file_doc["storage_key"]
 
-            download_url = await self.circuit_breaker.call(wrapped)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+        if file_doc.get("pack_offset") is not None:
+            # A presigned URL would expose the whole pack; ranges go via the API.
+            # Absolute, since clients open it as-is from the frontend origin.
+            return {
+                "file_id": file_id,
+                "filename": file_doc["filename"],
+                "download_url": f"{API_PUBLIC_URL.rstrip('/')}/files/{file_id}/content",
+                "expires_in": 600,
+            }
+
+        # 3️⃣ Generate presigned GET URL (signed locally, no storage round trip)
+        download_url = public_presigner.presign(
+            "GET",
+            storage_key,
+            600,
+            query={
+                "response-content-disposition": "inline",
+                "response-content-type": file_doc.get("detected_mime")
+                or file_doc.get("mime_type")
+                or "application/octet-stream",
+            },
+        )
 
         return {
             "file_id": file_id,
@@ -871,16 +2648,173 @@ class FileController:
             "expires_in": 600,
         }
 
-    async def debug_bucket_contents(self, prefix: str = ""):
+    # Served inline by the proxy; anything else (HTML, SVG, ...) is an attachment
+    # so it can't run script on the API origin
+    INLINE_MIME_PREFIXES = (
+        "image/",
+        "audio/",
+        "video/",
+        "application/pdf",
+        "text/plain",
+    )
+    INLINE_UNSAFE_MIME_TYPES = {"image/svg+xml"}
+
+    @staticmethod
+    def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+        """First and last byte of a single `bytes=` range; None serves the whole file.
+
+        Multi-range and malformed headers get the whole file, which RFC 9110
+        allows; a well-formed range outside the file is a 416.
+        """
+        if not header:
+            return None
+
+        unit, _, spec = header.partition("=")
+        first, sep, last = spec.strip().partition("-")
+        if unit.strip().lower() != "bytes" or "," in spec or not sep:
+            return None
+
         try:
-            loop = asyncio.get_event_loop()
+            if not first:
+                # Suffix range: the last N bytes
+                length = int(last)
+                start, end = max(size - length, 0), size - 1
+                if length <= 0:
+                    start = size
+            else:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+        except ValueError:
+            return None
+
+        if start >= size or end < start:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"},
+            )
 
-            def _list():
-                return s3_internal.list_objects_v2(
-                    Bucket=MINIO_BUCKET, Prefix=prefix, MaxKeys=100
-                )
+        return start, end
+
+    def _content_disposition(self, filename: str, content_type: str) -> str:
+        inline = (
+            content_type.startswith(self.INLINE_MIME_PREFIXES)
+            and content_type not in self.INLINE_UNSAFE_MIME_TYPES
+        )
+        disposition = "inline" if inline else "attachment"
+        return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+    async def stream_file_content(
+        self,
+        user,
+        file_id: str,
+        range_header: Optional[str] = None,
+        if_range: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+    ) -> Response:
+        """Stream a file, or one byte range of it, straight from storage.
+
+        Honours Range/If-Range so media players can seek, and If-None-Match
+        for revalidation. Preconditions are evaluated by storage against the
+        object's ETag, and storage chunks go to the client as they arrive.
+        Packed files are a range of their pack, so requested ranges shift
+        by the pack offset.
+        """
+        file_doc = await self._find_owned_file(user, file_id)
+
+        size = file_doc["size"]
+        base = file_doc.get("pack_offset") or 0
+        requested = self.parse_range(range_header, size)
+
+        # If-Range with a date or a weak tag can't prove the client's copy is current
+        if requested and if_range and not if_range.strip().startswith('"'):
+            requested = None
+
+        params = {"Bucket": MINIO_BUCKET, "Key": file_doc["storage_key"]}
+        if if_none_match:
+            params["IfNoneMatch"] = if_none_match
+
+        def _select(byte_range: Optional[Tuple[int, int]]):
+            params.pop("IfMatch", None)
+            params.pop("Range", None)
+            if byte_range:
+                first, last = byte_range
+                params["Range"] = f"bytes={base + first}-{base + last}"
+                if if_range:
+                    params["IfMatch"] = if_range
+            elif file_doc.get("pack_offset") is not None:
+                params["Range"] = self.byte_range(file_doc)
+
+        _select(requested)
+        s3_internal = await get_s3_internal()
+
+        try:
+            try:
+                obj = await s3_internal.get_object(**params)
+            except ClientError as e:
+                if not (
+                    requested
+                    and if_range
+                    and e.response["Error"]["Code"] in ("412", "PreconditionFailed")
+                ):
+                    raise
+                # The client's partial copy is stale: send the whole current file
+                requested = None
+                _select(None)
+                obj = await s3_internal.get_object(**params)
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            if code in ("304", "NotModified"):
+                return Response(status_code=304, headers={"ETag": if_none_match})
+            if code in ("404", "NoSuchKey"):
+                raise HTTPException(status_code=404, detail="File content missing")
+            raise
+
+        content_type = (
+            file_doc.get("detected_mime")
+            or file_doc.get("mime_type")
+            or "application/octet-stream"
+        )
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "private, no-transform",
+            "Content-Disposition": self._content_disposition(
+                file_doc["filename"], content_type
+            ),
+            "X-Content-Type-Options": "nosniff",
+        }
+        if obj.get("ETag"):
+            headers["ETag"] = obj["ETag"]
+        if obj.get("LastModified"):
+            headers["Last-Modified"] = format_datetime(obj["LastModified"], usegmt=True)
+
+        if requested:
+            first, last = requested
+            status_code = 206
+            headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+            headers["Content-Length"] = str(last - first + 1)
+        else:
+            status_code = 200
+            headers["Content-Length"] = str(size)
+
+        async def body():
+            async with obj["Body"] as stream:
+                async for chunk in stream.iter_chunks(self.PROXY_READ_CHUNK):
+                    yield chunk
+
+        return StreamingResponse(
+            body(),
+            status_code=status_code,
+            media_type=content_type,
+            headers=headers,
+        )
 
-            response = await loop.run_in_executor(None, _list)
+    async def debug_bucket_contents(self, prefix: str = ""):
+        try:
+            s3_internal = await get_s3_internal()
+            response = await s3_internal.list_objects_v2(
+                Bucket=MINIO_BUCKET, Prefix=prefix, MaxKeys=100
+            )
 
             objects = []
             for obj in response.get("Contents", []):
@@ -907,59 +2841,14 @@ class FileController:
 """FILE CONTROLLER ENDS HERE """
 
 
-class BackgroundCleaner:
-    """Background task to cleanup expired/orphaned files"""
-
-    def __init__(self, file_controller: FileController):
-        self.controller = file_controller
-        self.running = False
-
-    async def start(self):
-        """Start background cleanup task"""
-        self.running = True
-        while self.running:
-            try:
-                await self.cleanup_expired_files()
-                await asyncio.sleep(3600)
-            except Exception as e:
-                logger.error(f"Background cleanup error: {e}", exc_info=True)
-                await asyncio.sleep(60)
-
-    async def cleanup_expired_files(self):
-        """Cleanup files older than retention period"""
-        RETENTION_DAYS = 30
-        cutoff_date = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
-
-        expired_files = await self.controller.db.files.find(
-            {"created_at": {"$lt": cutoff_date}, "is_deleted": False}
-        ).to_list(length=1000)
-
-        if not expired_files:
-            return
-
-        logger.info(f"Cleaning up {len(expired_files)} expired files")
-
-        cleanup_tasks = [
-            self.controller._cleanup_storage(f["storage_key"]) for f in expired_files
-        ]
-        await asyncio.gather(*cleanup_tasks, return_exceptions=True)
-
-        file_ids = [f["file_id"] for f in expired_files]
-        await self.controller.db.files.update_many(
-            {"file_id": {"$in": file_ids}},
-            {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}},
-        )
-
-        logger.info(f"Cleanup completed for {len(expired_files)} files")
-
-    def stop(self):
-        """Stop background cleanup task"""
-        self.running = False
-
-
 class File_User:
     @staticmethod
-    async def get_files_uploaded_by_users(user):
+    async def get_files_uploaded_by_users(
+        user,
+        cursor: Optional[str] = None,
+        limit: int = FileController.LIST_PAGE_SIZE,
+        stream: bool = False,
+    ):
         try:
             # FIND IN DB
 
@@ -973,27 +2862,29 @@ class File_User:
             # EXTRACT USER ID AND FIND FILES UPLOADED BY THIS USER IN DB
 
             if user:
-                from core.database import get_db
+                controller = FileController()
+                query = {"sender_ID": user_id, "is_deleted": False}
 
-                db = get_db()
+                stats = await get_file_stats(USER_SCOPE, user_id)
 
-                cursor = db.files.find(
-                    {"sender_ID": user_id, "is_deleted": False},
-                    {
-                        "_id": 0,
-                        "file_id": 1,
-                        "filename": 1,
-                        "size": 1,
-                        "created_at": 1,
-                        "storage_key": 1,
-                    },
-                )
+                if stream:
+                    return controller._stream_listing(
+                        query, USER_LIST_PROJECTION, cursor, stats
+                    )
 
-                files = await cursor.to_list(length=None)
-                if not files or files is None:
+                files, next_token = await controller._list_page(
+                    query, USER_LIST_PROJECTION, cursor, limit
+                )
+                if not files and not cursor:
                     raise HTTPException(status_code=404, detail="FILE NOT FOUND")
 
-                return files
+                return {
+                    "success": True,
+                    "files": files,
+                    "next_cursor": next_token,
+                    "has_more": next_token is not None,
+                    **FileController._listing_totals(stats),
+                }
 
             return {"success": True, "message": "API BYPASSED"}
 
@@ -1015,28 +2906,20 @@ class File_User:
 
             db = get_db()
 
-            # 🔍 GET ALL FILES FIRST (for storage delete)
-            files_cursor = db.files.find(
-                {"sender_ID": user_id}, {"_id": 0, "storage_key": 1}
+            report = await File_User.purge_files(db, {"sender_ID": user_id})
+            archived = await File_User.purge_files(
+                db, {"sender_ID": user_id}, collection="files_archive"
             )
 
-            files = await files_cursor.to_list(length=None)
-
-            if not files:
+            if not report["files_deleted"] and not archived["files_deleted"]:
                 return {"success": True, "message": "No files to delete"}
 
-            for f in files:
-                try:
-                    if f.get("storage_key"):
-                        from core.s3_config import delete_from_storage
-
-                        delete_from_storage(f["storage_key"])
-                except Exception as e:
-                    print("Storage delete failed:", e)
-
-            result = await db.files.delete_many({"sender_ID": user_id})
-
-            return {"success": True, "deleted_count": result.deleted_count}
+            return {
+                "success": True,
+                "deleted_count": report["files_deleted"] + archived["files_deleted"],
+                "objects_deleted": report["deleted"] + archived["deleted"],
+                "objects_failed": len(report["failed"]) + len(archived["failed"]),
+            }
 
         except HTTPException:
             raise
@@ -1046,6 +2929,90 @@ class File_User:
             raise HTTPException(status_code=500, detail="INTERNAL SERVER ERROR")
 
 
+    @staticmethod
+    async def purge_files(
+        db,
+        query: Dict[str, Any],
+        batch_size: int = DELETE_OBJECTS_MAX_KEYS,
+        collection: str = "files",
+    ) -> Dict[str, Any]:
+        """Hard-delete matching files documents and the objects nothing else references.
+
+        Streams the cursor in batches: each batch is one delete_many plus
+        one refs update, and freed keys go straight into concurrent
+        DeleteObjects calls. Failed keys are handed to the GC to retry.
+        """
+        files_deleted = 0
+
+        async def _purge_batch(batch: List[Dict[str, Any]]) -> List[str]:
+            nonlocal files_deleted
+            result = await db[collection].delete_many(
+                {"_id": {"$in": [doc["_id"] for doc in batch]}}
+            )
+            files_deleted += result.deleted_count
+            if collection == "files":
+                await remove_live_files(
+                    doc for doc in batch if doc.get("is_deleted") is False
+                )
+
+            # Shared copies may still point at these objects
+            keys = [
+                doc["storage_key"]
+                for doc in batch
+                if doc.get("storage_key") and not doc.get("storage_released")
+            ]
+            await release_refs(keys)
+
+            # Blobs may be re-uploaded right now, so they wait for the GC grace period
+            claimed = await claim_unreferenced(
+                [
+                    k
+                    for k in set(keys)
+                    if not k.startswith(FileController.CONTENT_ADDRESSED_PREFIX)
+                ]
+            )
+            return with_thumbnails(claimed, batch)
+
+        async def freed_keys():
+            cursor = (
+                db[collection]
+                .find(
+                    query,
+                    {
+                        "_id": 1,
+                        "storage_key": 1,
+                        "storage_released": 1,
+                        "is_deleted": 1,
+                        "sender_ID": 1,
+                        "sharing_session_id": 1,
+                        "size": 1,
+                        "thumbnail_key": 1,
+                    },
+                )
+                .batch_size(batch_size)
+            )
+
+            batch = []
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    for key in await _purge_batch(batch):
+                        yield key
+                    batch = []
+
+            if batch:
+                for key in await _purge_batch(batch):
+                    yield key
+
+        report = await delete_objects(freed_keys(), batch_size=batch_size)
+
+        if report["failed"]:
+            await requeue_unreferenced([f["key"] for f in report["failed"]])
+
+        report["files_deleted"] = files_deleted
+        return report
+
+
 class sharing_files:
     @staticmethod
     async def share_files_between_client(qr_token, selected_file_ids, sender):
@@ -1082,6 +3049,7 @@ class sharing_files:
                     "file_id": {"$in": selected_file_ids},
                     "sender_ID": sender_id,
                     "is_deleted": False,
+                    "quarantined": {"$ne": True},
                 }
             ).to_list(length=None)
 
@@ -1098,6 +3066,19 @@ class sharing_files:
                         "filename": f["filename"],
                         "size": f["size"],
                         "mime_type": f.get("mime_type"),
+                        "detected_mime": f.get("detected_mime"),
+                        "inspection_status": f.get("inspection_status", "pending"),
+                        # The copy reads the same bytes: same pack slice, same thumbnail
+                        **{
+                            k: f[k]
+                            for k in (
+                                "pack_id",
+                                "pack_offset",
+                                "preview_status",
+                                "thumbnail_key",
+                            )
+                            if k in f
+                        },
                         "storage_key": f["storage_key"],  # 🔥 SAME KEY
                         "sender_ID": receiver_id,  # new owner
                         "original_owner": sender_id,
@@ -1112,7 +3093,10 @@ class sharing_files:
 
             # 💾 4. Bulk insert
             if new_docs:
+                await apply_retention(new_docs)
                 await db.files.insert_many(new_docs)
+                await add_refs(d["storage_key"] for d in new_docs)
+                await add_live_files(new_docs)
 
                 def mongo_response(data):
                     if isinstance(data, ObjectId):
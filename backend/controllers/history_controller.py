@@ -1,13 +1,24 @@
+import logging
 from core.database import get_db
 from fastapi import HTTPException
 
 from models.history_model import UserMeta, FileMeta, TransferHistory
 from datetime import datetime
+from typing import Optional
 from fastapi.responses import StreamingResponse
-import zipfile
-import io
-from core.s3_config import s3_internal
-from core.config import MINIO_BUCKET
+from utils.zip_stream import stream_zip
+from utils.object_prefetch import ObjectPrefetcher
+from controllers.file_controller import FileController
+from utils.pagination import keyset_filter, next_cursor
+
+logger = logging.getLogger(__name__)
+
+ZIP_READ_CHUNK_SIZE = 256 * 1024
+ZIP_PREFETCH_CONCURRENCY = 4
+ZIP_PREFETCH_BYTE_BUDGET = 64 * 1024 * 1024
+
+# Newest first; transfer_id breaks ties so the keyset order is total
+HISTORY_SORT = [("created_at", -1), ("transfer_id", -1)]
 
 
 class HistoryController:
@@ -18,6 +29,36 @@ class HistoryController:
         file_doc = await self.db.files.find_one({"file_id": file_id})
         return file_doc["storage_key"]
 
+    @staticmethod
+    def participants(history: dict) -> list:
+        """Distinct user ids on either side of a transfer"""
+        ids = [history["sender"]["user_id"], history["receiver"]["user_id"]]
+        return list(dict.fromkeys(i for i in ids if i))
+
+    @staticmethod
+    async def backfill_participants() -> int:
+        """Give transfers recorded before `participants` existed the array"""
+        db = get_db()
+
+        result = await db.transfer_history.update_many(
+            {"participants": {"$exists": False}},
+            [
+                {
+                    "$set": {
+                        "participants": {
+                            "$setUnion": [["$sender.user_id", "$receiver.user_id"]]
+                        }
+                    }
+                }
+            ],
+        )
+
+        if result.modified_count:
+            logger.info(
+                f"Backfilled participants on {result.modified_count} transfers"
+            )
+        return result.modified_count
+
     @staticmethod
     async def create_History(session: dict, files: list):
         try:
@@ -66,6 +107,9 @@ class HistoryController:
             )
 
             history_dict = history.dict()
+            history_dict["participants"] = HistoryController.participants(
+                history_dict
+            )
 
             # ✅ Convert UUID to string
             history_dict["transfer_id"] = str(history_dict["transfer_id"])
@@ -87,7 +131,11 @@ class HistoryController:
 
     @staticmethod
     async def get_history(
-        user: dict, type: str = "all", page: int = 0, limit: int = 20
+        user: dict,
+        type: str = "all",
+        cursor: Optional[str] = None,
+        limit: int = 20,
+        with_total: bool = False,
     ):
         try:
             db = get_db()
@@ -106,35 +154,35 @@ class HistoryController:
                 query = {"receiver.user_id": user_id}
 
             else:  # "all"
-                query = {
-                    "$or": [
-                        {"sender.user_id": user_id},
-                        {"receiver.user_id": user_id},
-                    ]
-                }
+                query = {"participants": user_id}
 
-            skip = page * limit
+            after = keyset_filter(cursor, "created_at", "transfer_id")
+            page_query = {"$and": [query, after]} if after else query
 
-            cursor = (
-                db.transfer_history.find(query, {"_id": 0})
-                .sort("created_at", -1)
-                .skip(skip)
-                .limit(limit)
+            # One extra row tells us whether another page exists
+            rows = (
+                db.transfer_history.find(page_query, {"_id": 0})
+                .sort(HISTORY_SORT)
+                .limit(limit + 1)
             )
 
-            history = await cursor.to_list(length=limit)
-
-            total = await db.transfer_history.count_documents(query)
+            history = await rows.to_list(length=limit + 1)
+            next_token = next_cursor(history, limit, "created_at", "transfer_id")
 
-            return {
+            response = {
                 "success": True,
-                "page": page,
                 "limit": limit,
-                "total": total,
-                "has_more": skip + limit < total,
+                "has_more": next_token is not None,
+                "next_cursor": next_token,
                 "history": history,
             }
 
+            # Counting walks every matching index entry, so only on request
+            if with_total:
+                response["total"] = await db.transfer_history.count_documents(query)
+
+            return response
+
         except HTTPException:
             raise
 
@@ -202,77 +250,53 @@ class HistoryController:
             print("❌ NO FILES FOUND")
             raise HTTPException(status_code=404, detail="No files in transfer")
 
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            for i, file in enumerate(files):
-                print(f"\n📄 FILE {i + 1}/{len(files)}")
-                print("FILE ID:", file["file_id"])
-                print("FILENAME:", file["filename"])
-
-                # ─────────────────────────────
-                # STEP 4: FETCH STORAGE KEY
-                # ─────────────────────────────
-                file_doc = await db.files.find_one(
-                    {"file_id": file["file_id"]},
-                    {"storage_key": 1, "_id": 0},
-                )
-
-                if not file_doc:
-                    print("❌ FILE DOC NOT FOUND")
-                    continue
-
-                storage_key = file_doc["storage_key"]
-                print("🗂 STORAGE KEY:", storage_key)
-
-                # ─────────────────────────────
-                # STEP 5: FETCH FROM MINIO
-                # ─────────────────────────────
-                try:
-                    obj = s3_internal.get_object(
-                        Bucket=MINIO_BUCKET,
-                        Key=storage_key,
-                    )
-
-                    data = obj["Body"].read()
-
-                    print("📥 DOWNLOADED FROM MINIO:", len(data), "bytes")
-
-                    if not data:
-                        print("⚠️ EMPTY FILE DATA")
-
-                    # ─────────────────────────────
-                    # STEP 6: ADD TO ZIP
-                    # ─────────────────────────────
-                    zip_file.writestr(file["filename"], data)
-                    print("✅ ADDED TO ZIP")
-
-                except Exception as e:
-                    print("❌ MINIO FETCH FAILED:", e)
-                    continue
-
-        # ─────────────────────────────
-        # STEP 7: FINAL ZIP CHECK
-        # ─────────────────────────────
-        zip_buffer.seek(0)
-        zip_bytes = zip_buffer.getvalue()
-
-        print("\n🧪 ZIP DEBUG")
-        print("ZIP SIZE:", len(zip_bytes))
+        # Resolve every storage key in one round trip, then let the
+        # prefetcher keep a few objects downloading while the archive is built.
+        file_ids = [f["file_id"] for f in files]
+        file_docs = {
+            doc["file_id"]: doc
+            async for doc in db.files.find(
+                {"file_id": {"$in": file_ids}, "quarantined": {"$ne": True}},
+                {
+                    "file_id": 1,
+                    "storage_key": 1,
+                    "size": 1,
+                    "pack_offset": 1,
+                    "_id": 0,
+                },
+            )
+        }
+
+        items = []
+        for file in files:
+            file_doc = file_docs.get(file["file_id"])
+            if not file_doc:
+                print("❌ FILE DOC NOT FOUND:", file["file_id"])
+                continue
+            # Packed files are read straight out of their pack as a byte range
+            items.append(
+                {
+                    **file,
+                    "storage_key": file_doc["storage_key"],
+                    "byte_range": FileController.byte_range(file_doc),
+                }
+            )
 
-        if len(zip_bytes) < 100:
-            print("⚠️ ZIP TOO SMALL → likely corrupted")
+        prefetcher = ObjectPrefetcher(
+            items,
+            concurrency=ZIP_PREFETCH_CONCURRENCY,
+            byte_budget=ZIP_PREFETCH_BYTE_BUDGET,
+            chunk_size=ZIP_READ_CHUNK_SIZE,
+        )
 
-        print("🚀 SENDING RESPONSE\n\n")
+        async def entries():
+            async for item, content_length, chunks in prefetcher:
+                yield item["filename"], content_length or item.get("size"), chunks
 
-        # ─────────────────────────────
-        # STEP 8: RESPONSE
-        # ─────────────────────────────
         return StreamingResponse(
-            iter([zip_bytes]),
+            stream_zip(entries()),
             media_type="application/zip",
             headers={
                 "Content-Disposition": f'attachment; filename="sharexpress_{transfer_id[:8]}.zip"',
-                "Content-Length": str(len(zip_bytes)),
             },
         )
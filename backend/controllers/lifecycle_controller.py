@@ -0,0 +1,449 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+from fastapi import HTTPException
+from botocore.exceptions import ClientError
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from core.database import get_db
+from core.config import MINIO_BUCKET, FILE_RETENTION_DAYS
+from core.s3_config import get_s3_internal
+from core.storage_delete import delete_objects
+from core.file_stats import remove_live_files
+from core.storage_refs import (
+    release_refs,
+    claim_unreferenced,
+    requeue_unreferenced,
+    collect_garbage,
+    with_thumbnails,
+)
+from core.retention import (
+    EXPIRY_CHECKPOINT_ID,
+    SESSION_SCOPE,
+    USER_SCOPE,
+    DAY_MS,
+    set_retention_policy,
+)
+from controllers.file_controller import FileController
+
+logger = logging.getLogger(__name__)
+
+
+class LifecycleController:
+    """Expires files by their indexed `expires_at` and runs storage housekeeping.
+
+    One worker at a time holds a lease in `lifecycle_state`; the expiry pass
+    walks `(expires_at, _id)` in batches and persists its position after
+    each one, so a restart resumes where it stopped instead of rescanning.
+    """
+
+    BATCH_SIZE = 1000
+    RUN_INTERVAL = 300
+    LEASE_ID = "lifecycle_lease"
+    LEASE_TTL = timedelta(minutes=15)
+    BACKFILL_ID = "expires_at_backfill"
+    # Soft-deleted files stay restorable in place this long before compaction
+    ARCHIVE_AFTER = timedelta(days=7)
+    # Background inspection normally finishes within seconds of the upload
+    INSPECTION_RETRY_AFTER = timedelta(minutes=5)
+    PREVIEW_RETRY_AFTER = timedelta(minutes=5)
+
+    def __init__(self):
+        self.db = get_db()
+        self.owner = str(uuid4())
+        self.running = False
+
+    # ---------- retention policies ----------
+
+    async def set_session_retention(
+        self, session: Dict[str, Any], user: Dict[str, Any], retention_days: int
+    ) -> Dict[str, Any]:
+        user_id = user.get("user_id") if user else None
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+        # Receivers hold the same sharing token; only the sender owns the files
+        if session.get("sender_ID") != user_id:
+            raise HTTPException(
+                status_code=403, detail="Only the session sender can set retention"
+            )
+
+        updated = await set_retention_policy(
+            SESSION_SCOPE,
+            session["sharing_session_ID"],
+            retention_days,
+            owner_id=session["sender_ID"],
+        )
+
+        return {
+            "success": True,
+            "scope": SESSION_SCOPE,
+            "retention_days": retention_days,
+            "files_updated": updated,
+        }
+
+    async def set_user_retention(
+        self, user: Dict[str, Any], retention_days: int
+    ) -> Dict[str, Any]:
+        user_id = user.get("user_id") if user else None
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+        updated = await set_retention_policy(
+            USER_SCOPE, user_id, retention_days, owner_id=user_id
+        )
+
+        return {
+            "success": True,
+            "scope": USER_SCOPE,
+            "retention_days": retention_days,
+            "files_updated": updated,
+        }
+
+    # ---------- background loop ----------
+
+    async def start(self):
+        """Run housekeeping every RUN_INTERVAL seconds while holding the lease"""
+        self.running = True
+        while self.running:
+            try:
+                if await self._acquire_lease():
+                    await self.run_once()
+                await asyncio.sleep(self.RUN_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Lifecycle run failed: {e}", exc_info=True)
+                await asyncio.sleep(60)
+
+    def stop(self):
+        self.running = False
+
+    async def run_exclusive(self) -> Optional[Dict[str, Any]]:
+        """run_once under the lease for one-off runs; None if another worker holds it"""
+        if not await self._acquire_lease():
+            return None
+
+        try:
+            return await self.run_once()
+        finally:
+            await self._release_lease()
+
+    async def _release_lease(self):
+        await self.db.lifecycle_state.update_one(
+            {"_id": self.LEASE_ID, "owner": self.owner},
+            {"$set": {"expires_at": datetime.utcnow()}},
+        )
+
+    async def _acquire_lease(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.db.lifecycle_state.find_one_and_update(
+                {
+                    "_id": self.LEASE_ID,
+                    "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}],
+                },
+                {"$set": {"owner": self.owner, "expires_at": now + self.LEASE_TTL}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # Another worker holds a live lease
+            return False
+
+    async def run_once(self) -> Dict[str, Any]:
+        expiry = await self.expire_files()
+        archived_files = await self.compact_deleted_files()
+        file_controller = FileController()
+        inspected_files = await file_controller.inspect_pending(
+            self.INSPECTION_RETRY_AFTER
+        )
+        previewed_files = await file_controller.preview_pending(
+            self.PREVIEW_RETRY_AFTER
+        )
+        aborted_uploads = await self.abort_stale_multipart_uploads()
+        collected_objects = await collect_garbage()
+
+        return {
+            **expiry,
+            "archived_files": archived_files,
+            "inspected_files": inspected_files,
+            "previewed_files": previewed_files,
+            "aborted_uploads": aborted_uploads,
+            "collected_objects": collected_objects,
+        }
+
+    # ---------- expiry ----------
+
+    async def expire_files(self) -> Dict[str, Any]:
+        """Soft-delete every live file past `expires_at` and free its object"""
+        await self._backfill_expires_at()
+
+        now = datetime.utcnow()
+        checkpoint = await self.db.lifecycle_state.find_one(
+            {"_id": EXPIRY_CHECKPOINT_ID}
+        )
+
+        query = {"is_deleted": False, "expires_at": {"$lte": now}}
+        if checkpoint:
+            query["$or"] = [
+                {"expires_at": {"$gt": checkpoint["expires_at"]}},
+                {
+                    "expires_at": checkpoint["expires_at"],
+                    "_id": {"$gt": checkpoint["last_id"]},
+                },
+            ]
+
+        expired = 0
+
+        async def freed_keys():
+            nonlocal expired
+            cursor = (
+                self.db.files.find(
+                    query,
+                    {
+                        "_id": 1,
+                        "storage_key": 1,
+                        "storage_released": 1,
+                        "expires_at": 1,
+                        "sender_ID": 1,
+                        "sharing_session_id": 1,
+                        "size": 1,
+                        "thumbnail_key": 1,
+                    },
+                )
+                .sort([("expires_at", 1), ("_id", 1)])
+                .batch_size(self.BATCH_SIZE)
+            )
+
+            batch = []
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= self.BATCH_SIZE:
+                    count, keys = await self._expire_batch(batch)
+                    expired += count
+                    for key in keys:
+                        yield key
+                    batch = []
+
+            if batch:
+                count, keys = await self._expire_batch(batch)
+                expired += count
+                for key in keys:
+                    yield key
+
+        report = await delete_objects(freed_keys(), batch_size=self.BATCH_SIZE)
+
+        if report["failed"]:
+            await requeue_unreferenced([f["key"] for f in report["failed"]])
+
+        if expired:
+            logger.info(
+                f"Expired {expired} files, deleted {report['deleted']} objects"
+            )
+
+        return {
+            "expired_files": expired,
+            "objects_deleted": report["deleted"],
+            "objects_failed": len(report["failed"]),
+        }
+
+    async def _expire_batch(
+        self, batch: List[Dict[str, Any]]
+    ) -> Tuple[int, List[str]]:
+        """Soft-delete one batch, move the checkpoint past it and claim freed keys.
+
+        Documents may be deleted or released by a request between the read
+        and the update, so each write tags what it actually changed with a
+        per-batch claim id, and stats and refs follow only those documents.
+        """
+        now = datetime.utcnow()
+        claim = str(uuid4())
+        ids = [doc["_id"] for doc in batch]
+
+        await self.db.files.update_many(
+            {"_id": {"$in": ids}, "is_deleted": False},
+            {
+                "$set": {
+                    "is_deleted": True,
+                    "deleted_at": now,
+                    "updated_at": now,
+                    "expiry_claim": claim,
+                }
+            },
+        )
+        await self.db.files.update_many(
+            {
+                "_id": {"$in": ids},
+                "expiry_claim": claim,
+                "storage_released": {"$ne": True},
+            },
+            {"$set": {"storage_released": True, "release_claim": claim}},
+        )
+
+        claimed = {
+            doc["_id"]: doc
+            for doc in await self.db.files.find(
+                {"_id": {"$in": ids}, "expiry_claim": claim},
+                {"_id": 1, "release_claim": 1},
+            ).to_list(length=len(ids))
+        }
+        expired = [doc for doc in batch if doc["_id"] in claimed]
+
+        await remove_live_files(expired)
+
+        keys = [
+            doc["storage_key"]
+            for doc in expired
+            if doc.get("storage_key")
+            and claimed[doc["_id"]].get("release_claim") == claim
+        ]
+        await release_refs(keys)
+
+        last = batch[-1]
+        await self.db.lifecycle_state.update_one(
+            {"_id": EXPIRY_CHECKPOINT_ID},
+            {
+                "$set": {
+                    "expires_at": last["expires_at"],
+                    "last_id": last["_id"],
+                    "updated_at": now,
+                }
+            },
+            upsert=True,
+        )
+
+        # Shared blobs may be re-uploaded right now, so they wait for the GC grace period
+        claimed = await claim_unreferenced(
+            [
+                k
+                for k in set(keys)
+                if not k.startswith(FileController.CONTENT_ADDRESSED_PREFIX)
+            ]
+        )
+        return len(expired), with_thumbnails(claimed, expired)
+
+    async def _backfill_expires_at(self):
+        """One-off: give files created before lifecycle policies an expires_at"""
+        if await self.db.lifecycle_state.find_one({"_id": self.BACKFILL_ID}):
+            return
+
+        result = await self.db.files.update_many(
+            {"expires_at": {"$exists": False}},
+            [
+                {
+                    "$set": {
+                        "expires_at": {
+                            "$add": ["$created_at", FILE_RETENTION_DAYS * DAY_MS]
+                        }
+                    }
+                }
+            ],
+        )
+        await self.db.lifecycle_state.update_one(
+            {"_id": self.BACKFILL_ID},
+            {"$set": {"done_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+        logger.info(f"Backfilled expires_at on {result.modified_count} files")
+
+    # ---------- compaction ----------
+
+    async def compact_deleted_files(self) -> int:
+        """Move soft-deleted files past ARCHIVE_AFTER into files_archive in bulk"""
+        cutoff = datetime.utcnow() - self.ARCHIVE_AFTER
+        cursor = self.db.files.find(
+            {"is_deleted": True, "deleted_at": {"$lte": cutoff}}
+        ).batch_size(self.BATCH_SIZE)
+
+        archived = 0
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.BATCH_SIZE:
+                archived += await self._archive_batch(batch)
+                batch = []
+
+        if batch:
+            archived += await self._archive_batch(batch)
+
+        if archived:
+            logger.info(f"Archived {archived} deleted files")
+
+        return archived
+
+    async def _archive_batch(self, batch: List[Dict[str, Any]]) -> int:
+        now = datetime.utcnow()
+        ids = [doc["_id"] for doc in batch]
+
+        try:
+            await self.db.files_archive.insert_many(
+                [{**doc, "archived_at": now} for doc in batch], ordered=False
+            )
+        except BulkWriteError as e:
+            # Duplicates are leftovers of an interrupted run; anything else stays put
+            failed = {
+                batch[err["index"]]["_id"]
+                for err in e.details.get("writeErrors", [])
+                if err.get("code") != 11000
+            }
+            ids = [i for i in ids if i not in failed]
+
+        result = await self.db.files.delete_many(
+            {"_id": {"$in": ids}, "is_deleted": True}
+        )
+
+        # Restored while we were copying: the live document wins
+        restored = await self.db.files.distinct("_id", {"_id": {"$in": ids}})
+        if restored:
+            await self.db.files_archive.delete_many({"_id": {"$in": restored}})
+
+        return result.deleted_count
+
+    # ---------- multipart ----------
+
+    async def abort_stale_multipart_uploads(self) -> int:
+        """Abort multipart uploads that were started but never completed"""
+        cutoff = datetime.utcnow() - FileController.MULTIPART_STALE_AFTER
+        s3_internal = await get_s3_internal()
+        paginator = s3_internal.get_paginator("list_multipart_uploads")
+        aborted = 0
+
+        async for page in paginator.paginate(Bucket=MINIO_BUCKET):
+            for upload in page.get("Uploads", []):
+                if upload["Initiated"].replace(tzinfo=None) > cutoff:
+                    continue
+
+                try:
+                    await s3_internal.abort_multipart_upload(
+                        Bucket=MINIO_BUCKET,
+                        Key=upload["Key"],
+                        UploadId=upload["UploadId"],
+                    )
+                    aborted += 1
+                except ClientError as e:
+                    logger.warning(f"Failed to abort upload for {upload['Key']}: {e}")
+
+        await self.db.upload_manifests.update_many(
+            {"status": "in_progress", "created_at": {"$lt": cutoff}},
+            {"$set": {"status": "aborted", "updated_at": datetime.utcnow()}},
+        )
+
+        if aborted:
+            logger.info(f"Aborted {aborted} stale multipart uploads")
+
+        return aborted
@@ -272,20 +272,11 @@ class Qr_controller:
                 )
                 raise HTTPException(status_code=400, detail="QR code is inactive")
 
-            # Check expiry
+            # Check expiry (the expires_at TTL index removes the document later;
+            # nothing is written here)
+            now = datetime.utcnow()
             expires_at = qr_code.get("expires_at")
-            if expires_at and datetime.utcnow() > expires_at:
-                # Auto-deactivate expired QR
-                await db.qr_codes.update_one(
-                    {"qr_token": qr_token},
-                    {
-                        "$set": {
-                            "is_active": False,
-                            "revoked_at": datetime.utcnow(),
-                            "revoke_reason": "expired",
-                        }
-                    },
-                )
+            if expires_at and now > expires_at:
                 await Qr_controller._log_access(
                     qr_id=qr_id,
                     action="verify",
@@ -352,12 +343,26 @@ class Qr_controller:
             if is_new_scanner:
                 update_data["$addToSet"] = {"unique_scanners": scanner_hash}
 
+            # The filter re-checks state, so a code revoked or expired since the
+            # read above is not counted
             update_result = await db.qr_codes.find_one_and_update(
-                {"qr_token": qr_token, "is_active": True},
+                {
+                    "qr_token": qr_token,
+                    "is_active": True,
+                    "$or": [
+                        {"expires_at": None},
+                        {"expires_at": {"$gt": now}},
+                    ],
+                },
                 update_data,
                 return_document=ReturnDocument.AFTER,
             )
 
+            if not update_result:
+                raise HTTPException(
+                    status_code=400, detail="QR code is inactive or expired"
+                )
+
             return {
                 "success": True,
                 "qr_id": update_result["qr_id"],
@@ -0,0 +1,195 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict
+from core.database import get_db
+from core.config import MINIO_BUCKET
+from core.s3_config import get_s3_internal
+from core.storage_delete import delete_objects
+from controllers.file_controller import FileController
+from utils.sorted_merge import merge_sorted_keys
+
+logger = logging.getLogger(__name__)
+
+
+class ReconcileController:
+    """Finds bucket objects no document tracks, and documents whose object is gone.
+
+    The bucket listing and every key source are walked in ascending key
+    order side by side (a merge join), so memory stays constant however
+    large the bucket is. The API only reports; purging is CLI-only:
+
+        python -m controllers.reconcile_controller --purge
+    """
+
+    SAMPLE_SIZE = 100
+    REPORT_ID = "reconcile_report"
+
+    # Nothing younger than the longest-lived upload URL or policy is an orphan
+    ORPHAN_MIN_AGE = timedelta(
+        seconds=max(
+            600,
+            FileController.MULTIPART_URL_EXPIRES,
+            FileController.POST_POLICY_EXPIRES,
+        )
+    )
+
+    def __init__(self):
+        self.db = get_db()
+
+    async def _sorted_keys(
+        self, collection, field: str, query: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        cursor = collection.find(query, {field: 1}).sort(field, 1).batch_size(1000)
+        async for doc in cursor:
+            key = doc.get(field)
+            if isinstance(key, str):
+                yield key
+
+    def _key_sources(self) -> Dict[str, AsyncIterator[str]]:
+        """Every place an object key can be referenced from, each sorted by key.
+
+        `files` is the authoritative source for "missing object" checks;
+        the others only keep their objects from being treated as orphans.
+        """
+        return {
+            "files": self._sorted_keys(
+                self.db.files, "storage_key", {"storage_released": {"$ne": True}}
+            ),
+            # Compacted soft-deleted files keep their object until released
+            "files_archive": self._sorted_keys(
+                self.db.files_archive,
+                "storage_key",
+                {"storage_released": {"$ne": True}},
+            ),
+            # Thumbnails derived from live objects
+            "thumbnails": self._sorted_keys(
+                self.db.files,
+                "thumbnail_key",
+                {
+                    "thumbnail_key": {"$exists": True},
+                    "storage_released": {"$ne": True},
+                },
+            ),
+            # Compacted documents keep their thumbnail along with the original
+            "archived_thumbnails": self._sorted_keys(
+                self.db.files_archive,
+                "thumbnail_key",
+                {
+                    "thumbnail_key": {"$exists": True},
+                    "storage_released": {"$ne": True},
+                },
+            ),
+            # Unreferenced keys waiting out the GC grace period
+            "storage_refs": self._sorted_keys(self.db.storage_refs, "_id", {}),
+        }
+
+    async def _bucket_objects(self) -> AsyncIterator[Dict[str, Any]]:
+        s3_internal = await get_s3_internal()
+        paginator = s3_internal.get_paginator("list_objects_v2")
+
+        async for page in paginator.paginate(Bucket=MINIO_BUCKET):
+            for obj in page.get("Contents", []):
+                yield obj
+
+    async def reconcile(self, purge: bool = False) -> Dict[str, Any]:
+        """Merge-join the bucket with the key sources; optionally delete old orphans"""
+        started_at = datetime.utcnow()
+        cutoff = started_at - self.ORPHAN_MIN_AGE
+        report = {
+            "objects_scanned": 0,
+            "orphaned_objects": 0,
+            "orphaned_bytes": 0,
+            "missing_objects": 0,
+            "orphan_samples": [],
+            "missing_samples": [],
+        }
+
+        def _orphan(obj: Dict[str, Any]) -> bool:
+            report["orphaned_objects"] += 1
+            report["orphaned_bytes"] += obj.get("Size", 0)
+            if len(report["orphan_samples"]) < self.SAMPLE_SIZE:
+                report["orphan_samples"].append(obj["Key"])
+            return obj["LastModified"].replace(tzinfo=None) < cutoff
+
+        def _missing(key: str):
+            report["missing_objects"] += 1
+            if len(report["missing_samples"]) < self.SAMPLE_SIZE:
+                report["missing_samples"].append(key)
+
+        async def purgeable() -> AsyncIterator[str]:
+            objects = self._bucket_objects()
+            known = merge_sorted_keys(self._key_sources())
+
+            obj = await anext(objects, None)
+            entry = await anext(known, None)
+
+            while obj is not None or entry is not None:
+                if entry is None or (obj is not None and obj["Key"] < entry[0]):
+                    report["objects_scanned"] += 1
+                    if _orphan(obj) and purge:
+                        yield obj["Key"]
+                    obj = await anext(objects, None)
+
+                elif obj is None or entry[0] < obj["Key"]:
+                    if "files" in entry[1]:
+                        _missing(entry[0])
+                    entry = await anext(known, None)
+
+                else:
+                    report["objects_scanned"] += 1
+                    obj = await anext(objects, None)
+                    entry = await anext(known, None)
+
+        deleted = await delete_objects(purgeable())
+        report["purged"] = deleted["deleted"]
+        report["purge_failed"] = len(deleted["failed"])
+
+        report["duration_seconds"] = round(
+            (datetime.utcnow() - started_at).total_seconds(), 2
+        )
+        await self.db.lifecycle_state.update_one(
+            {"_id": self.REPORT_ID},
+            {"$set": {**report, "finished_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+        logger.info(
+            f"Reconcile: scanned={report['objects_scanned']}, "
+            f"orphaned={report['orphaned_objects']}, "
+            f"missing={report['missing_objects']}, purged={report['purged']}"
+        )
+
+        return report
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Reconcile the bucket with MongoDB")
+    parser.add_argument(
+        "--purge",
+        action="store_true",
+        help="delete orphaned objects older than the upload TTL",
+    )
+    args = parser.parse_args()
+
+    report = await ReconcileController().reconcile(purge=args.purge)
+    for key in ("objects_scanned", "orphaned_objects", "missing_objects", "purged"):
+        print(f"{key:17} {report[key]}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
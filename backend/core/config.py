@@ -61,6 +61,26 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET")
 MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+# auth_token configured on MinIO's notify_webhook target for ObjectCreated events
+MINIO_WEBHOOK_TOKEN = os.getenv("MINIO_WEBHOOK_TOKEN")
+
+
+# ADMIN API
+
+# Bearer token for maintenance endpoints (manual lifecycle runs, reconcile)
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+
+# FILE LIFECYCLE
+
+# Default retention when neither the session nor the user has a policy
+FILE_RETENTION_DAYS = int(os.getenv("FILE_RETENTION_DAYS", 30))
+
+# TTL windows: MongoDB removes these documents on its own once they pass
+QR_ACCESS_LOG_RETENTION_DAYS = int(os.getenv("QR_ACCESS_LOG_RETENTION_DAYS", 30))
+# Guest QR codes outlive their expiry briefly so sessions opened with them resolve
+EXPIRED_QR_RETENTION_HOURS = int(os.getenv("EXPIRED_QR_RETENTION_HOURS", 24))
+REVOKED_QR_RETENTION_DAYS = int(os.getenv("REVOKED_QR_RETENTION_DAYS", 30))
 
 
 # FRONTEND CONFIG
@@ -68,6 +88,12 @@ MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
 FRONTEND_URI = os.getenv("FRONTEND_URI")
 
 
+# API CONFIG
+
+# Public base URL of this API as browsers reach it (VITE_API_URL on the frontend)
+API_PUBLIC_URL = os.getenv("API_PUBLIC_URL", "http://localhost:8000")
+
+
 # REDIS CONFIG
 
 REDIS_HOST = os.getenv("REDIS_HOST", None)
@@ -0,0 +1,106 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable
+from pymongo import UpdateOne
+from core.database import get_db
+
+logger = logging.getLogger(__name__)
+
+db = get_db()
+
+# file_stats: {_id: "<scope>:<id>", count: <live files>, size: <their bytes>}
+#
+# Kept in step with every write that makes a files document live (insert,
+# restore) or not (soft delete, expiry, purge), so listings can report totals
+# without aggregating over the collection.
+SESSION_SCOPE = "session"
+USER_SCOPE = "user"
+SCOPE_FIELDS = ((SESSION_SCOPE, "sharing_session_id"), (USER_SCOPE, "sender_ID"))
+
+
+def _stats_id(scope: str, scope_id: str) -> str:
+    return f"{scope}:{scope_id}"
+
+
+async def _apply(docs: Iterable[Dict[str, Any]], sign: int) -> None:
+    deltas: Dict[str, Dict[str, int]] = {}
+    for doc in docs:
+        for scope, field in SCOPE_FIELDS:
+            if not doc.get(field):
+                continue
+            delta = deltas.setdefault(
+                _stats_id(scope, doc[field]), {"count": 0, "size": 0}
+            )
+            delta["count"] += sign
+            delta["size"] += sign * (doc.get("size") or 0)
+
+    if not deltas:
+        return
+
+    now = datetime.utcnow()
+    await db.file_stats.bulk_write(
+        [
+            UpdateOne(
+                {"_id": stats_id},
+                {"$inc": delta, "$set": {"updated_at": now}},
+                upsert=True,
+            )
+            for stats_id, delta in deltas.items()
+        ],
+        ordered=False,
+    )
+
+
+async def add_live_files(docs: Iterable[Dict[str, Any]]) -> None:
+    await _apply(docs, 1)
+
+
+async def remove_live_files(docs: Iterable[Dict[str, Any]]) -> None:
+    await _apply(docs, -1)
+
+
+async def get_file_stats(scope: str, scope_id: str) -> Dict[str, int]:
+    stats = await db.file_stats.find_one({"_id": _stats_id(scope, scope_id)})
+    return {
+        "count": max(stats["count"], 0) if stats else 0,
+        "size": max(stats["size"], 0) if stats else 0,
+    }
+
+
+async def backfill_file_stats() -> int:
+    """Build file_stats from the files collection the first time it is needed"""
+    if await db.file_stats.estimated_document_count() > 0:
+        return 0
+
+    now = datetime.utcnow()
+    for scope, field in SCOPE_FIELDS:
+        await db.files.aggregate(
+            [
+                {"$match": {"is_deleted": False, field: {"$ne": None}}},
+                {
+                    "$group": {
+                        "_id": {"$concat": [f"{scope}:", f"${field}"]},
+                        "count": {"$sum": 1},
+                        "size": {"$sum": {"$ifNull": ["$size", 0]}},
+                    }
+                },
+                {"$set": {"updated_at": now}},
+                {"$merge": {"into": "file_stats", "whenMatched": "keepExisting"}},
+            ]
+        ).to_list(length=None)
+
+    count = await db.file_stats.estimated_document_count()
+    logger.info(f"Backfilled {count} file stats")
+    return count
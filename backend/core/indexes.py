@@ -10,30 +10,424 @@
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
 #
+"""Declarative index registry.
 
+INDEXES is the single source of truth for every index the app relies on.
+reconcile_indexes() makes the database match it (idempotent; runs at
+startup) and check_query_plans() explains the hot controller queries and
+reports any that would still scan a whole collection.
+
+    python -m core.indexes [--prune] [--check-plans]
+"""
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
 from core.database import get_db
+from core.config import (
+    QR_ACCESS_LOG_RETENTION_DAYS,
+    EXPIRED_QR_RETENTION_HOURS,
+    REVOKED_QR_RETENTION_DAYS,
+)
+
+logger = logging.getLogger(__name__)
 
 db = get_db()
 
+LIVE = {"is_deleted": False}
+DAY = 24 * 60 * 60
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "user": [
+        IndexModel("user_id", unique=True),
+        IndexModel("email"),
+    ],
+    "guest_sessions": [
+        IndexModel("session_id", unique=True),
+        # TTL: a session is gone once its (sliding) expiry passes
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ],
+    "sharing_session": [
+        IndexModel(
+            [
+                ("qr_token", ASCENDING),
+                ("sender_ID", ASCENDING),
+                ("receiver_ID", ASCENDING),
+            ],
+            unique=True,
+            name="unique_share_relationship",
+        ),
+        IndexModel("sharing_token"),
+        IndexModel("sharing_session_ID"),
+    ],
+    "share_sessions": [
+        IndexModel("session_id", unique=True),
+        IndexModel("sender_id"),
+        IndexModel("receiver_id"),
+        IndexModel("expires_at"),
+        IndexModel("status"),
+    ],
+    "qr_codes": [
+        IndexModel("qr_token", unique=True),
+        IndexModel([("owner_type", ASCENDING), ("owner_id", ASCENDING)]),
+        # TTL: expiring (guest) codes; permanent codes have no expires_at
+        IndexModel("expires_at", expireAfterSeconds=EXPIRED_QR_RETENTION_HOURS * 3600),
+        # TTL: deactivated codes are kept a while for the audit trail
+        IndexModel(
+            "revoked_at",
+            expireAfterSeconds=REVOKED_QR_RETENTION_DAYS * DAY,
+            partialFilterExpression={"is_active": False},
+            name="revoked_qr_ttl",
+        ),
+    ],
+    "qr_access_log": [
+        IndexModel([("identifier_hash", ASCENDING), ("timestamp", ASCENDING)]),
+        IndexModel("qr_id"),
+        # TTL: rate limiting only looks back minutes; the rest is audit history
+        IndexModel("timestamp", expireAfterSeconds=QR_ACCESS_LOG_RETENTION_DAYS * DAY),
+    ],
+    "transfer_history": [
+        IndexModel("transfer_id", unique=True),
+        # Keyset pages seek on (created_at, transfer_id) within one user;
+        # participants (multikey) serves the "all" view without an $or
+        IndexModel(
+            [
+                ("participants", ASCENDING),
+                ("created_at", DESCENDING),
+                ("transfer_id", DESCENDING),
+            ]
+        ),
+        IndexModel(
+            [
+                ("sender.user_id", ASCENDING),
+                ("created_at", DESCENDING),
+                ("transfer_id", DESCENDING),
+            ]
+        ),
+        IndexModel(
+            [
+                ("receiver.user_id", ASCENDING),
+                ("created_at", DESCENDING),
+                ("transfer_id", DESCENDING),
+            ]
+        ),
+    ],
+    "files": [
+        # file_id is the upsert key for upload completion
+        IndexModel("file_id", unique=True),
+        # Listings are keyset-paged on (created_at, file_id). Session listings
+        # may include deleted files (and purges and restores use the prefix),
+        # so only the per-user live listing gets a partial index.
+        IndexModel(
+            [
+                ("sharing_session_id", ASCENDING),
+                ("created_at", DESCENDING),
+                ("file_id", DESCENDING),
+            ],
+            name="session_files",
+        ),
+        IndexModel(
+            [
+                ("sender_ID", ASCENDING),
+                ("created_at", DESCENDING),
+                ("file_id", DESCENDING),
+            ],
+            partialFilterExpression=LIVE,
+            name="sender_live_files",
+        ),
+        IndexModel("sender_ID"),
+        IndexModel("content_sha256", sparse=True),
+        IndexModel("storage_key"),
+        IndexModel("thumbnail_key", sparse=True),
+        IndexModel(
+            "created_at",
+            partialFilterExpression={"inspection_status": "pending"},
+            name="pending_inspection",
+        ),
+        IndexModel(
+            "inspected_at",
+            partialFilterExpression={"preview_status": "pending"},
+            name="pending_preview",
+        ),
+        # Lifecycle expiry walks (expires_at, _id) from its checkpoint
+        IndexModel(
+            [("expires_at", ASCENDING), ("_id", ASCENDING)],
+            partialFilterExpression=LIVE,
+        ),
+        IndexModel("deleted_at", partialFilterExpression={"is_deleted": True}),
+    ],
+    # Compacted soft-deleted files
+    "files_archive": [
+        IndexModel("file_id", unique=True),
+        IndexModel("sender_ID"),
+        IndexModel("storage_key"),
+        IndexModel("thumbnail_key", sparse=True),
+    ],
+    "retention_policies": [
+        IndexModel([("scope", ASCENDING), ("scope_id", ASCENDING)], unique=True),
+    ],
+    # GC sweep
+    "storage_refs": [
+        IndexModel([("refs", ASCENDING), ("zero_since", ASCENDING)]),
+    ],
+    # Small-file packs awaiting completion
+    "pack_manifests": [
+        IndexModel("pack_id", unique=True),
+    ],
+    # Resumable multipart uploads
+    "upload_manifests": [
+        IndexModel("file_id", unique=True),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    # Checksum-signed blob PUTs, checked once by complete_upload
+    "blob_uploads": [
+        IndexModel("file_id", unique=True),
+        # TTL: the signed URL is long expired by then
+        IndexModel("created_at", expireAfterSeconds=DAY),
+    ],
+}
+
+# Representative shapes of the hot controller queries: (collection, filter, sort).
+# Only the shape matters to the planner, so the values are placeholders.
+HOT_QUERIES: List[Tuple[str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("user", {"user_id": ""}, None),
+    ("user", {"email": ""}, None),
+    ("guest_sessions", {"session_id": ""}, None),
+    (
+        "sharing_session",
+        {"sharing_token": "", "is_active": True, "status": "active"},
+        None,
+    ),
+    ("sharing_session", {"sharing_session_ID": {"$in": [""]}}, None),
+    ("qr_codes", {"qr_token": ""}, None),
+    ("qr_codes", {"owner_type": "user", "owner_id": "", "is_active": True}, None),
+    ("qr_access_log", {"identifier_hash": "", "timestamp": {"$gte": 0}}, None),
+    ("qr_access_log", {"qr_id": ""}, None),
+    ("transfer_history", {"transfer_id": ""}, None),
+    (
+        "transfer_history",
+        {"participants": "", "created_at": {"$lte": 0}},
+        [("created_at", DESCENDING), ("transfer_id", DESCENDING)],
+    ),
+    (
+        "transfer_history",
+        {"sender.user_id": "", "created_at": {"$lte": 0}},
+        [("created_at", DESCENDING), ("transfer_id", DESCENDING)],
+    ),
+    (
+        "transfer_history",
+        {"receiver.user_id": "", "created_at": {"$lte": 0}},
+        [("created_at", DESCENDING), ("transfer_id", DESCENDING)],
+    ),
+    ("files", {"file_id": ""}, None),
+    ("files", {"file_id": "", "sender_ID": "", "is_deleted": False}, None),
+    (
+        "files",
+        {"sharing_session_id": "", "is_deleted": False},
+        [("created_at", DESCENDING), ("file_id", DESCENDING)],
+    ),
+    (
+        "files",
+        {"sharing_session_id": ""},
+        [("created_at", DESCENDING), ("file_id", DESCENDING)],
+    ),
+    (
+        "files",
+        {"sender_ID": "", "is_deleted": False},
+        [("created_at", DESCENDING), ("file_id", DESCENDING)],
+    ),
+    ("files", {"sender_ID": ""}, None),
+    (
+        "files",
+        {"content_sha256": {"$in": [""]}, "sender_ID": "", "is_deleted": False},
+        None,
+    ),
+    ("files", {"inspection_status": "pending", "created_at": {"$lte": 0}}, None),
+    ("files", {"is_deleted": True, "deleted_at": {"$lte": 0}}, None),
+    ("storage_refs", {"refs": {"$lte": 0}, "zero_since": {"$lte": 0}}, None),
+    ("upload_manifests", {"file_id": ""}, None),
+    ("blob_uploads", {"file_id": {"$in": [""]}, "sender_ID": ""}, None),
+    ("pack_manifests", {"pack_id": ""}, None),
+]
+
+_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _key(spec) -> Tuple[Tuple[str, Any], ...]:
+    return tuple(
+        (field, int(direction) if isinstance(direction, (int, float)) else direction)
+        for field, direction in spec.items()
+    )
+
+
+def _options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: spec[k] for k in _OPTIONS if spec.get(k) not in (None, False)}
+
+
+def _ttl_only_change(current: Dict[str, Any], spec: Dict[str, Any]) -> bool:
+    def _rest(index):
+        return {
+            k: v for k, v in _options(index).items() if k != "expireAfterSeconds"
+        }
+
+    return (
+        "expireAfterSeconds" in spec
+        and "expireAfterSeconds" in current
+        and _key(current["key"]) == _key(spec["key"])
+        and _rest(current) == _rest(spec)
+    )
+
+
+async def _reconcile_collection(
+    name: str, models: List[IndexModel], prune: bool, report: Dict[str, List[str]]
+):
+    collection = db[name]
+    existing = {
+        info["name"]: info
+        async for info in collection.list_indexes()
+        if info["name"] != "_id_"
+    }
+    by_key = {_key(info["key"]): info["name"] for info in existing.values()}
+    wanted = set()
+
+    for model in models:
+        spec = model.document
+        index_name = spec["name"]
+        label = f"{name}.{index_name}"
+        wanted.add(index_name)
+
+        current = existing.get(index_name)
+        try:
+            if current is None and _key(spec["key"]) in by_key:
+                # Same keys under another name (e.g. created by hand): replace it
+                old_name = by_key.pop(_key(spec["key"]))
+                await collection.drop_index(old_name)
+                existing.pop(old_name)
+                await collection.create_indexes([model])
+                report["rebuilt"].append(label)
+
+            elif current is None:
+                await collection.create_indexes([model])
+                report["created"].append(label)
+
+            elif _key(current["key"]) != _key(spec["key"]) or (
+                _options(current) != _options(spec)
+            ):
+                if _ttl_only_change(current, spec):
+                    # collMod changes a TTL in place, without a rebuild
+                    await db.command(
+                        "collMod",
+                        name,
+                        index={
+                            "name": index_name,
+                            "expireAfterSeconds": spec["expireAfterSeconds"],
+                        },
+                    )
+                else:
+                    await collection.drop_index(index_name)
+                    await collection.create_indexes([model])
+                report["rebuilt"].append(label)
 
-async def create_indexes():
-    # share_sessions indexes
+            else:
+                report["unchanged"].append(label)
 
-    await db.sharing_session.create_index(
-        [
-            ("qr_token", 1),
-            ("sender_ID", 1),
-            ("receiver_ID", 1),
-        ],
-        unique=True,
-        name="unique_share_relationship",
+        except OperationFailure as e:
+            # One bad index (e.g. duplicates under a new unique key) must not
+            # stop the others or the app from starting
+            logger.error(f"Index {label} failed: {e}")
+            report["failed"].append(label)
+
+    for index_name in existing:
+        if index_name in wanted:
+            continue
+        label = f"{name}.{index_name}"
+        if prune:
+            await collection.drop_index(index_name)
+            report["dropped"].append(label)
+        else:
+            report["unmanaged"].append(label)
+
+
+async def reconcile_indexes(prune: bool = False) -> Dict[str, List[str]]:
+    """Create missing indexes and rebuild changed ones; drop unlisted ones if `prune`"""
+    report = {
+        "created": [],
+        "rebuilt": [],
+        "unchanged": [],
+        "dropped": [],
+        "unmanaged": [],
+        "failed": [],
+    }
+
+    for name, models in INDEXES.items():
+        await _reconcile_collection(name, models, prune, report)
+
+    logger.info(
+        f"Indexes: created={len(report['created'])}, "
+        f"rebuilt={len(report['rebuilt'])}, dropped={len(report['dropped'])}, "
+        f"unmanaged={len(report['unmanaged'])}, failed={len(report['failed'])}"
+    )
+    return report
+
+
+def _stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    for child in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(child), dict):
+            yield from _stages(plan[child])
+    for sub in plan.get("inputStages", []):
+        yield from _stages(sub)
+
+
+async def check_query_plans() -> List[Dict[str, Any]]:
+    """Explain each HOT_QUERIES entry; return those whose winning plan is a COLLSCAN"""
+    offenders = []
+
+    for name, query, sort in HOT_QUERIES:
+        cursor = db[name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+
+        explained = await cursor.explain()
+        plan = explained.get("queryPlanner", {}).get("winningPlan", {})
+
+        if "COLLSCAN" in set(_stages(plan)):
+            offenders.append({"collection": name, "filter": query, "sort": sort})
+            logger.warning(f"COLLSCAN: {name}.find({query}) sort={sort}")
+
+    return offenders
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Reconcile MongoDB indexes")
+    parser.add_argument(
+        "--prune", action="store_true", help="drop indexes not in the registry"
+    )
+    parser.add_argument(
+        "--check-plans",
+        action="store_true",
+        help="explain hot queries and exit non-zero on any COLLSCAN",
     )
+    args = parser.parse_args()
+
+    report = await reconcile_indexes(prune=args.prune)
+    for action, labels in report.items():
+        for label in labels:
+            if action != "unchanged":
+                print(f"{action:10} {label}")
+
+    failed = bool(report["failed"])
+    if args.check_plans:
+        offenders = await check_query_plans()
+        for offender in offenders:
+            print(f"COLLSCAN   {offender['collection']} {offender['filter']}")
+        failed = failed or bool(offenders)
+
+    raise SystemExit(1 if failed else 0)
 
-    await db.share_sessions.create_index("session_id", unique=True)
-    await db.share_sessions.create_index("sender_id")
-    await db.share_sessions.create_index("receiver_id")
-    await db.share_sessions.create_index("expires_at")
-    await db.share_sessions.create_index("status")
 
-    # qr_codes indexes
-    await db.qr_codes.create_index("qr_token", unique=True)
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
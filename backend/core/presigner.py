@@ -0,0 +1,212 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import base64
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+
+# (key, extra query params, extra signed headers)
+PresignRequest = Tuple[str, Optional[Dict[str, str]], Optional[Dict[str, str]]]
+
+
+@lru_cache(maxsize=16)
+def _signing_key(secret_key: str, date_stamp: str, region: str, service: str) -> bytes:
+    """SigV4 derived key; valid for a whole UTC day, so four HMACs per day instead of per URL"""
+    key = ("AWS4" + secret_key).encode()
+    for part in (date_stamp, region, service, "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return key
+
+
+def _encode(value: str) -> str:
+    return quote(str(value), safe="-_.~")
+
+
+class S3Presigner:
+    """In-process SigV4 query-string presigner for path-style S3/MinIO URLs.
+
+    Produces the same URLs as botocore's generate_presigned_url for the
+    operations we use, without building a request object per URL.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: Optional[str],
+        access_key: Optional[str],
+        secret_key: Optional[str],
+        region: str,
+        bucket: Optional[str],
+        service: str = "s3",
+    ):
+        parts = urlsplit(endpoint_url or "")
+        self.scheme = parts.scheme or "http"
+        self.host = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.access_key = access_key or ""
+        self.secret_key = secret_key or ""
+        self.region = region
+        self.bucket = bucket or ""
+        self.service = service
+
+    def _sign_one(
+        self,
+        method: str,
+        key: str,
+        expires: int,
+        amz_date: str,
+        scope: str,
+        signing_key: bytes,
+        query: Optional[Dict[str, str]],
+        headers: Optional[Dict[str, str]],
+    ) -> str:
+        path = quote(f"{self.base_path}/{self.bucket}/{key}", safe="/~")
+
+        signed = {"host": self.host}
+        for name, value in (headers or {}).items():
+            signed[name.lower()] = " ".join(str(value).split())
+        header_names = sorted(signed)
+        signed_headers = ";".join(header_names)
+
+        params = {
+            "X-Amz-Algorithm": ALGORITHM,
+            "X-Amz-Credential": f"{self.access_key}/{scope}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires),
+            "X-Amz-SignedHeaders": signed_headers,
+        }
+        params.update(query or {})
+
+        encoded = sorted((_encode(k), _encode(v)) for k, v in params.items())
+        canonical_query = "&".join(f"{k}={v}" for k, v in encoded)
+
+        canonical_request = "\n".join(
+            [
+                method,
+                path,
+                canonical_query,
+                "".join(f"{name}:{signed[name]}\n" for name in header_names),
+                signed_headers,
+                UNSIGNED_PAYLOAD,
+            ]
+        )
+
+        string_to_sign = "\n".join(
+            [
+                ALGORITHM,
+                amz_date,
+                scope,
+                hashlib.sha256(canonical_request.encode()).hexdigest(),
+            ]
+        )
+
+        signature = hmac.new(
+            signing_key, string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+
+        return (
+            f"{self.scheme}://{self.host}{path}?{canonical_query}"
+            f"&X-Amz-Signature={signature}"
+        )
+
+    def presign_many(
+        self,
+        method: str,
+        requests: Iterable[PresignRequest],
+        expires: int = 600,
+        now: Optional[datetime] = None,
+    ) -> List[str]:
+        """Presign a batch of keys sharing one timestamp, scope and signing key"""
+        now = now or datetime.utcnow()
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+        scope = f"{date_stamp}/{self.region}/{self.service}/aws4_request"
+        signing_key = _signing_key(
+            self.secret_key, date_stamp, self.region, self.service
+        )
+
+        return [
+            self._sign_one(
+                method, key, expires, amz_date, scope, signing_key, query, headers
+            )
+            for key, query, headers in requests
+        ]
+
+    def presign(
+        self,
+        method: str,
+        key: str,
+        expires: int = 600,
+        query: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> str:
+        return self.presign_many(method, [(key, query, headers)], expires)[0]
+
+    def presign_post(
+        self,
+        key_prefix: str,
+        max_size: int,
+        expires: int = 3600,
+        min_size: int = 1,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """Browser POST policy allowing any number of uploads under `key_prefix`.
+
+        The client adds `key` (starting with the prefix), `Content-Type` and
+        `file` to the returned form fields.
+        """
+        now = now or datetime.utcnow()
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+        credential = (
+            f"{self.access_key}/{date_stamp}/{self.region}/{self.service}/aws4_request"
+        )
+
+        policy = {
+            "expiration": (now + timedelta(seconds=expires)).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            ),
+            "conditions": [
+                {"bucket": self.bucket},
+                ["starts-with", "$key", key_prefix],
+                ["starts-with", "$Content-Type", ""],
+                ["content-length-range", min_size, max_size],
+                {"x-amz-algorithm": ALGORITHM},
+                {"x-amz-credential": credential},
+                {"x-amz-date": amz_date},
+            ],
+        }
+
+        encoded_policy = base64.b64encode(json.dumps(policy).encode()).decode()
+        signing_key = _signing_key(
+            self.secret_key, date_stamp, self.region, self.service
+        )
+
+        return {
+            "url": f"{self.scheme}://{self.host}{self.base_path}/{self.bucket}",
+            "fields": {
+                "x-amz-algorithm": ALGORITHM,
+                "x-amz-credential": credential,
+                "x-amz-date": amz_date,
+                "policy": encoded_policy,
+                "x-amz-signature": hmac.new(
+                    signing_key, encoded_policy.encode(), hashlib.sha256
+                ).hexdigest(),
+            },
+        }
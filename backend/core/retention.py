@@ -0,0 +1,106 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from core.database import get_db
+from core.config import FILE_RETENTION_DAYS
+
+db = get_db()
+
+# retention_policies: {scope: "session" | "user", scope_id, retention_days,
+# owner_id, updated_at}. A session policy wins over its owner's user policy,
+# which wins over FILE_RETENTION_DAYS.
+SESSION_SCOPE = "session"
+USER_SCOPE = "user"
+
+# lifecycle_state document holding the expiry cursor position
+EXPIRY_CHECKPOINT_ID = "files_expiry"
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+async def apply_retention(docs: List[Dict[str, Any]]) -> None:
+    """Set `expires_at` on new files documents (in place) from the matching policies"""
+    if not docs:
+        return
+
+    session_ids = list({d.get("sharing_session_id") for d in docs})
+    user_ids = list({d.get("sender_ID") for d in docs})
+
+    policies = await db.retention_policies.find(
+        {
+            "$or": [
+                {"scope": SESSION_SCOPE, "scope_id": {"$in": session_ids}},
+                {"scope": USER_SCOPE, "scope_id": {"$in": user_ids}},
+            ]
+        },
+        {"_id": 0, "scope": 1, "scope_id": 1, "retention_days": 1},
+    ).to_list(length=None)
+
+    days = {(p["scope"], p["scope_id"]): p["retention_days"] for p in policies}
+
+    for doc in docs:
+        retention_days = (
+            days.get((SESSION_SCOPE, doc.get("sharing_session_id")))
+            or days.get((USER_SCOPE, doc.get("sender_ID")))
+            or FILE_RETENTION_DAYS
+        )
+        doc["expires_at"] = doc["created_at"] + timedelta(days=retention_days)
+
+
+async def set_retention_policy(
+    scope: str, scope_id: str, retention_days: int, owner_id: str
+) -> int:
+    """Store a policy and re-derive expires_at for the live files it governs"""
+    await db.retention_policies.update_one(
+        {"scope": scope, "scope_id": scope_id},
+        {
+            "$set": {
+                "retention_days": retention_days,
+                "owner_id": owner_id,
+                "updated_at": datetime.utcnow(),
+            }
+        },
+        upsert=True,
+    )
+
+    if scope == SESSION_SCOPE:
+        query = {"sharing_session_id": scope_id, "is_deleted": False}
+    else:
+        # Sessions with their own policy keep it
+        overridden = await db.retention_policies.distinct(
+            "scope_id", {"scope": SESSION_SCOPE, "owner_id": owner_id}
+        )
+        query = {
+            "sender_ID": scope_id,
+            "is_deleted": False,
+            "sharing_session_id": {"$nin": overridden},
+        }
+
+    result = await db.files.update_many(
+        query,
+        [
+            {
+                "$set": {
+                    "expires_at": {
+                        "$add": ["$created_at", retention_days * DAY_MS]
+                    }
+                }
+            }
+        ],
+    )
+
+    # Expiry may have moved before the checkpoint, so the next run starts over
+    await db.lifecycle_state.delete_one({"_id": EXPIRY_CHECKPOINT_ID})
+
+    return result.modified_count
@@ -10,9 +10,13 @@
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
 #
-import boto3
-import boto3
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from typing import Optional
+from aiobotocore.session import get_session
 from botocore.client import Config
+from core.presigner import S3Presigner
 from core.config import (
     MINIO_ACCESS_KEY,
     MINIO_SECRET_KEY,
@@ -22,72 +26,109 @@ from core.config import (
     MINIO_ENDPOINT_INTERNAL,
 )
 
-s3_client = boto3.client(
-    "s3",
-    endpoint_url=MINIO_ENDPOINT_PUBLIC,
-    aws_access_key_id=MINIO_ACCESS_KEY,
-    aws_secret_access_key=MINIO_SECRET_KEY,
-    region_name=MINIO_REGION,
-    config=Config(
-        signature_version="s3v4",
-        s3={"addressing_style": "path"},
-    ),
-)
+logger = logging.getLogger(__name__)
+
+# One pooled, keep-alive connection set shared by every controller.
+MAX_POOL_CONNECTIONS = 50
 
+# S3 DeleteObjects limit per request
+DELETE_OBJECTS_MAX_KEYS = 1000
 
-s3_internal = boto3.client(
-    "s3",
-    endpoint_url=MINIO_ENDPOINT_INTERNAL,
-    aws_access_key_id=MINIO_ACCESS_KEY,
-    aws_secret_access_key=MINIO_SECRET_KEY,
-    region_name=MINIO_REGION,
-    config=Config(
-        signature_version="s3v4",
-        s3={"addressing_style": "path"},
-    ),
+S3_CONFIG = Config(
+    signature_version="s3v4",
+    s3={"addressing_style": "path"},
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=30,
+    retries={"max_attempts": 2},
 )
 
-s3_public = boto3.client(
-    "s3",
-    endpoint_url=MINIO_ENDPOINT_PUBLIC,
-    aws_access_key_id=MINIO_ACCESS_KEY,
-    aws_secret_access_key=MINIO_SECRET_KEY,
-    region_name=MINIO_REGION,
-    config=Config(
-        signature_version="s3v4",
-        s3={"addressing_style": "path"},
-    ),
+
+class StorageClients:
+    """Owns the long-lived async S3 client for the internal endpoint.
+
+    Browser-facing URLs never touch the network, they are signed locally by
+    `public_presigner` below.
+    """
+
+    def __init__(self):
+        self._session = get_session()
+        self._stack = None
+        self._lock = asyncio.Lock()
+        self.internal = None
+
+    async def _create_client(self, endpoint_url: str):
+        return await self._stack.enter_async_context(
+            self._session.create_client(
+                "s3",
+                endpoint_url=endpoint_url,
+                aws_access_key_id=MINIO_ACCESS_KEY,
+                aws_secret_access_key=MINIO_SECRET_KEY,
+                region_name=MINIO_REGION,
+                config=S3_CONFIG,
+            )
+        )
+
+    async def start(self):
+        async with self._lock:
+            if self._stack is not None:
+                return
+
+            self._stack = AsyncExitStack()
+            self.internal = await self._create_client(MINIO_ENDPOINT_INTERNAL)
+            logger.info("S3 storage client started")
+
+    async def close(self):
+        async with self._lock:
+            if self._stack is None:
+                return
+
+            await self._stack.aclose()
+            self._stack = None
+            self.internal = None
+            logger.info("S3 storage client closed")
+
+
+storage_clients = StorageClients()
+
+# Presigned URLs are handed to browsers, so they are signed for the public endpoint
+public_presigner = S3Presigner(
+    MINIO_ENDPOINT_PUBLIC,
+    MINIO_ACCESS_KEY,
+    MINIO_SECRET_KEY,
+    MINIO_REGION,
+    MINIO_BUCKET,
 )
 
-print(MINIO_ACCESS_KEY, MINIO_BUCKET, MINIO_ENDPOINT_PUBLIC, MINIO_SECRET_KEY)
 
+async def get_s3_internal():
+    """Client for server-side object operations (HEAD/GET/PUT/DELETE/LIST)"""
+    if storage_clients.internal is None:
+        await storage_clients.start()
+    return storage_clients.internal
 
-def generate_presigned_upload_url(object_name: str, content_type: str = None):
-    params = {
-        "Bucket": MINIO_BUCKET,
-        "Key": object_name,
-    }
 
-    if content_type:
-        params["ContentType"] = content_type
+async def close_storage_clients():
+    await storage_clients.close()
 
-    url = s3_public.generate_presigned_url(
-        ClientMethod="put_object",
-        Params=params,
-        ExpiresIn=600,
-    )
-    return url
+
+def generate_presigned_upload_url(object_name: str, content_type: str = None):
+    headers = {"Content-Type": content_type} if content_type else None
+    return public_presigner.presign("PUT", object_name, 600, headers=headers)
 
 
-def ensure_bucket():
-    buckets = s3_client.list_buckets()
+async def ensure_bucket():
+    s3_internal = await get_s3_internal()
+    buckets = await s3_internal.list_buckets()
     if not any(b["Name"] == MINIO_BUCKET for b in buckets["Buckets"]):
-        s3_client.create_bucket(Bucket=MINIO_BUCKET)
+        await s3_internal.create_bucket(Bucket=MINIO_BUCKET)
 
 
-def delete_from_storage(object_name: str):
+async def delete_from_storage(object_name: str):
     try:
-        s3_client.delete_object(
+        s3_internal = await get_s3_internal()
+        await s3_internal.delete_object(
             Bucket=MINIO_BUCKET,
             Key=object_name,
         )
@@ -97,34 +138,44 @@ def delete_from_storage(object_name: str):
         return False
 
 
-def delete_many_from_storage(keys: list[str]):
-    try:
-        objects = [{"Key": k} for k in keys]
-
-        s3_client.delete_objects(
-            Bucket=MINIO_BUCKET,
-            Delete={"Objects": objects},
-        )
-
-        return True
-    except Exception as e:
-        print("❌ Bulk delete error:", e)
-        return False
-
-
-def generate_presigned_download_url(object_name: str):
+async def delete_many_from_storage(keys: list[str]) -> list[dict]:
+    """DeleteObjects in chunks of at most 1000 keys; returns the per-key failures"""
+    failed = []
+    s3_internal = await get_s3_internal()
+
+    for i in range(0, len(keys), DELETE_OBJECTS_MAX_KEYS):
+        chunk = keys[i : i + DELETE_OBJECTS_MAX_KEYS]
+        try:
+            response = await s3_internal.delete_objects(
+                Bucket=MINIO_BUCKET,
+                Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True},
+            )
+            failed.extend(
+                {"key": e["Key"], "code": e.get("Code"), "message": e.get("Message")}
+                for e in response.get("Errors", [])
+            )
+        except Exception as e:
+            print("❌ Bulk delete error:", e)
+            failed.extend(
+                {"key": k, "code": "RequestFailed", "message": str(e)} for k in chunk
+            )
+
+    return failed
+
+
+def generate_presigned_download_url(
+    object_name: str, content_type: Optional[str] = None
+):
     try:
-        url = s3_public.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={
-                "Bucket": MINIO_BUCKET,
-                "Key": object_name,
-                "ResponseContentDisposition": "inline",
-                "ResponseContentType": "application/octet-stream",
+        return public_presigner.presign(
+            "GET",
+            object_name,
+            600,
+            query={
+                "response-content-disposition": "inline",
+                "response-content-type": content_type or "application/octet-stream",
             },
-            ExpiresIn=600,
         )
-        return url
     except Exception as e:
         print("Download URL error:", e)
         return None
@@ -0,0 +1,74 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import asyncio
+import logging
+from typing import Any, AsyncIterable, Dict, List
+from core.s3_config import DELETE_OBJECTS_MAX_KEYS, delete_many_from_storage
+
+logger = logging.getLogger(__name__)
+
+DELETE_CONCURRENCY = 4
+
+
+async def delete_objects(
+    keys: AsyncIterable[str],
+    concurrency: int = DELETE_CONCURRENCY,
+    batch_size: int = DELETE_OBJECTS_MAX_KEYS,
+) -> Dict[str, Any]:
+    """Delete a stream of keys with up to `concurrency` DeleteObjects calls in flight.
+
+    Keys are consumed lazily (e.g. straight from a Mongo cursor), so memory
+    stays at `concurrency` batches however many keys there are. Returns
+    `{"deleted": n, "failed": [{"key", "code", "message"}, ...]}`.
+    """
+    report = {"deleted": 0, "failed": []}
+    in_flight = set()
+
+    async def _delete(batch: List[str]):
+        failed = await delete_many_from_storage(batch)
+        report["deleted"] += len(batch) - len(failed)
+        report["failed"].extend(failed)
+
+    async def _submit(batch: List[str]):
+        nonlocal in_flight
+        if len(in_flight) >= concurrency:
+            done, in_flight = await asyncio.wait(
+                in_flight, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                task.result()
+        in_flight.add(asyncio.create_task(_delete(batch)))
+
+    try:
+        batch = []
+        async for key in keys:
+            batch.append(key)
+            if len(batch) >= batch_size:
+                await _submit(batch)
+                batch = []
+
+        if batch:
+            await _submit(batch)
+
+        await asyncio.gather(*in_flight)
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+    if report["failed"]:
+        logger.warning(
+            f"Bulk delete: {report['deleted']} deleted, "
+            f"{len(report['failed'])} failed"
+        )
+
+    return report
@@ -0,0 +1,220 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from core.database import get_db
+from core.storage_delete import delete_objects
+from utils.thumbnails import THUMBNAIL_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+db = get_db()
+
+# storage_refs: {_id: storage_key, refs: <files documents still needing the
+# object>, zero_since: <when refs last dropped to 0, else None>}
+#
+# Objects are only deleted by collect_garbage(), once a key has had no
+# references for GC_GRACE. The grace window covers a key being referenced
+# again (a new upload of the same content-addressed blob) while a sweep runs.
+GC_GRACE = timedelta(minutes=30)
+GC_BATCH_SIZE = 1000
+
+# Objects generated from an original (thumbnails) are stored at the original's
+# key plus one of these suffixes and are deleted together with it.
+DERIVED_SUFFIXES = (THUMBNAIL_SUFFIX,)
+
+
+def derived_keys(key: str) -> List[str]:
+    if key.endswith(DERIVED_SUFFIXES):
+        return []
+    return [f"{key}{suffix}" for suffix in DERIVED_SUFFIXES]
+
+
+def with_thumbnails(claimed: List[str], docs: Iterable[dict]) -> List[str]:
+    """Claimed keys plus the thumbnail each of `docs` recorded for a claimed key"""
+    freed = set(claimed)
+    thumbnails = {
+        doc["thumbnail_key"]
+        for doc in docs
+        if doc.get("thumbnail_key") and doc.get("storage_key") in freed
+    }
+    return claimed + sorted(thumbnails - freed)
+
+
+async def add_refs(keys: Iterable[str]) -> None:
+    counts = Counter(k for k in keys if k)
+    if not counts:
+        return
+
+    now = datetime.utcnow()
+    await db.storage_refs.bulk_write(
+        [
+            UpdateOne(
+                {"_id": key},
+                [
+                    {
+                        "$set": {
+                            "refs": {"$add": [{"$ifNull": ["$refs", 0]}, n]},
+                            "zero_since": None,
+                            "updated_at": now,
+                        }
+                    }
+                ],
+                upsert=True,
+            )
+            for key, n in counts.items()
+        ],
+        ordered=False,
+    )
+
+
+async def release_refs(keys: Iterable[str]) -> None:
+    """Drop references; keys without a refs document (pre-refcount data) are left alone"""
+    counts = Counter(k for k in keys if k)
+    if not counts:
+        return
+
+    now = datetime.utcnow()
+    await db.storage_refs.bulk_write(
+        [
+            UpdateOne(
+                {"_id": key},
+                [
+                    {"$set": {"refs": {"$subtract": ["$refs", n]}, "updated_at": now}},
+                    {
+                        "$set": {
+                            "zero_since": {
+                                "$cond": [{"$lte": ["$refs", 0]}, now, None]
+                            }
+                        }
+                    },
+                ],
+            )
+            for key, n in counts.items()
+        ],
+        ordered=False,
+    )
+
+
+async def touch_refs(keys: Iterable[str]) -> None:
+    """Restart the grace period of unreferenced keys that are about to be reused"""
+    keys = list(set(keys))
+    if keys:
+        await db.storage_refs.update_many(
+            {"_id": {"$in": keys}, "refs": {"$lte": 0}},
+            {"$set": {"zero_since": datetime.utcnow()}},
+        )
+
+
+async def backfill_storage_refs() -> int:
+    """Build storage_refs from the files collection the first time it is needed"""
+    if await db.storage_refs.estimated_document_count() > 0:
+        return 0
+
+    await db.files.aggregate(
+        [
+            {"$match": {"storage_released": {"$ne": True}}},
+            {"$group": {"_id": "$storage_key", "refs": {"$sum": 1}}},
+            {"$match": {"_id": {"$ne": None}}},
+            {
+                "$set": {
+                    "zero_since": None,
+                    "updated_at": datetime.utcnow(),
+                }
+            },
+            {"$merge": {"into": "storage_refs", "whenMatched": "keepExisting"}},
+        ]
+    ).to_list(length=None)
+
+    count = await db.storage_refs.estimated_document_count()
+    logger.info(f"Backfilled {count} storage refs")
+    return count
+
+
+async def claim_unreferenced(
+    keys: List[str], cutoff: Optional[datetime] = None
+) -> List[str]:
+    """Remove refs documents of keys still unreferenced (since `cutoff` if given).
+
+    Returns the claimed keys and their derived keys, whose objects are now
+    safe to delete. Keys without a refs document are never claimed, and a
+    key referenced again between the lookup and the claim survives.
+    """
+    query = {"_id": {"$in": keys}, "refs": {"$lte": 0}}
+    if cutoff is not None:
+        query["zero_since"] = {"$lte": cutoff}
+
+    unreferenced = await db.storage_refs.distinct("_id", query)
+    if not unreferenced:
+        return []
+
+    await db.storage_refs.delete_many(
+        {"_id": {"$in": unreferenced}, "refs": {"$lte": 0}}
+    )
+    survivors = set(
+        await db.storage_refs.distinct("_id", {"_id": {"$in": unreferenced}})
+    )
+    claimed = [k for k in unreferenced if k not in survivors]
+    return claimed + [d for k in claimed for d in derived_keys(k)]
+
+
+async def collect_garbage(batch_size: int = GC_BATCH_SIZE) -> int:
+    """Delete objects whose keys have been unreferenced for longer than GC_GRACE"""
+    cutoff = datetime.utcnow() - GC_GRACE
+
+    async def claimed_keys():
+        cursor = db.storage_refs.find(
+            {"refs": {"$lte": 0}, "zero_since": {"$lte": cutoff}}, {"_id": 1}
+        ).batch_size(batch_size)
+
+        batch = []
+        async for doc in cursor:
+            batch.append(doc["_id"])
+            if len(batch) >= batch_size:
+                for key in await claim_unreferenced(batch, cutoff):
+                    yield key
+                batch = []
+
+        if batch:
+            for key in await claim_unreferenced(batch, cutoff):
+                yield key
+
+    report = await delete_objects(claimed_keys(), batch_size=batch_size)
+
+    if report["failed"]:
+        await requeue_unreferenced([f["key"] for f in report["failed"]])
+
+    if report["deleted"]:
+        logger.info(f"GC deleted {report['deleted']} unreferenced objects")
+
+    return report["deleted"]
+
+
+async def requeue_unreferenced(keys: List[str]) -> None:
+    """Hand keys whose delete failed back to the next GC sweep"""
+    now = datetime.utcnow()
+    try:
+        await db.storage_refs.insert_many(
+            [
+                {"_id": k, "refs": 0, "zero_since": now, "updated_at": now}
+                for k in keys
+            ],
+            ordered=False,
+        )
+    except BulkWriteError:
+        # Keys referenced again since the claim already have a document
+        pass
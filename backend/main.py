@@ -20,9 +20,15 @@ from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 import os
+import asyncio
 from contextlib import asynccontextmanager
-from core.indexes import create_indexes
-from core.s3_config import ensure_bucket
+from core.indexes import reconcile_indexes
+from core.s3_config import ensure_bucket, close_storage_clients
+from core.storage_refs import backfill_storage_refs
+from core.file_stats import backfill_file_stats
+from utils.thumbnails import shutdown_preview_pool
+from controllers.lifecycle_controller import LifecycleController
+from controllers.history_controller import HistoryController
 
 # ROUTERS IMPORTS
 
@@ -42,9 +48,23 @@ load_dotenv()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    ensure_bucket()
+    await reconcile_indexes()
+    await HistoryController.backfill_participants()
+    await ensure_bucket()
+    await backfill_storage_refs()
+    await backfill_file_stats()
+
+    lifecycle = LifecycleController()
+    lifecycle_task = asyncio.create_task(lifecycle.start())
+
     yield
 
+    lifecycle.stop()
+    lifecycle_task.cancel()
+    await asyncio.gather(lifecycle_task, return_exceptions=True)
+    shutdown_preview_pool()
+    await close_storage_clients()
+
 
 # @asynccontextmanager
 # async def lifespan(app: FastAPI):
@@ -58,7 +78,7 @@ app = FastAPI(
     title="QR Authentication API",
     description="API for user authentication and QR code management",
     version="1.0.0",
-    # lifespan=lifespan,
+    lifespan=lifespan,
 )
 
 
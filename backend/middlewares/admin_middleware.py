@@ -0,0 +1,28 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import hmac
+from typing import Optional
+from fastapi import Header, HTTPException
+from core.config import ADMIN_API_TOKEN
+
+
+async def verify_admin_token(authorization: Optional[str] = Header(default=None)):
+    """Guard maintenance endpoints with the ADMIN_API_TOKEN bearer token"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin API is not configured")
+
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.encode(), ADMIN_API_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -70,9 +70,17 @@ class FileMetadata(BaseModel):
         ..., min_length=1, max_length=255, description="Original filename"
     )
     size: int = Field(
-        ..., gt=0, le=20_971_520, description="File size in bytes (max 20MB)"
+        ...,
+        gt=0,
+        le=1_073_741_824,
+        description="File size in bytes (max 1GB, multipart above 20MB)",
     )
     content_type: str = Field(..., description="MIME type of the file")
+    sha256: Optional[str] = Field(
+        None,
+        pattern=r"^[0-9a-f]{64}$",
+        description="Hex SHA-256 of the content; opts into deduplicated storage",
+    )
 
     @validator("filename")
     def validate_filename(cls, v):
@@ -133,6 +141,7 @@ class CompletedFile(BaseModel):
     filename: str
     size: int = Field(..., gt=0)
     content_type: Optional[str] = None
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-f]{64}$")
     file_permissions: Optional[List[FilePermission]] = None
 
     class Config:
@@ -155,6 +164,52 @@ class CompleteUploadRequest(BaseModel):
     )
 
 
+class PackInitRequest(BaseModel):
+    """Small files to upload concatenated into one pack object"""
+
+    files: List[FileMetadata] = Field(
+        ...,
+        min_items=1,
+        max_items=5000,
+        description="Files in pack order; each at most 1MB, 20MB per pack",
+    )
+
+
+class CompletePackRequest(BaseModel):
+    """Request to record every file of an uploaded pack"""
+
+    pack_id: str
+
+
+class RetentionPolicyRequest(BaseModel):
+    """How long files stay available before the lifecycle job expires them"""
+
+    retention_days: int = Field(..., ge=1, le=365)
+
+
+class MultipartPart(BaseModel):
+    """ETag returned by S3 for one uploaded part"""
+
+    part_number: int = Field(..., ge=1, le=10000)
+    etag: str
+
+
+class CompleteMultipartRequest(BaseModel):
+    """Request to assemble the parts of a multipart upload"""
+
+    file_id: str
+    parts: Optional[List[MultipartPart]] = Field(
+        default=None,
+        description="Part ETags; omit to let the server read them via ListParts",
+    )
+
+
+class AbortMultipartRequest(BaseModel):
+    """Request to abandon a multipart upload"""
+
+    file_id: str
+
+
 class CompleteUploadResponse(BaseModel):
     """Response from upload completion"""
 
@@ -169,9 +224,15 @@ class FileListResponse(BaseModel):
 
     success: bool
     files: List[Dict[str, Any]]
-    total_count: int
-    total_size: int
-    total_size_human: str
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    # total_* for live listings; live_* when deleted files are included
+    total_count: Optional[int] = None
+    total_size: Optional[int] = None
+    total_size_human: Optional[str] = None
+    live_count: Optional[int] = None
+    live_size: Optional[int] = None
+    live_size_human: Optional[str] = None
 
 
 class DownloadResponse(BaseModel):
@@ -23,6 +23,9 @@ class TransferHistory(BaseModel):
     sender: UserMeta
     receiver: UserMeta
 
+    # sender and receiver user ids, for the single-index "all" history view
+    participants: List[str] = Field(default_factory=list)
+
     direction: str = Field(..., description="Direction of transfer: sender_to_receiver")
 
     files: List[FileMeta]
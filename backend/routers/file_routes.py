@@ -12,13 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Query, status, Body
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Request,
+    Query,
+    status,
+    Body,
+    Header,
+)
 from fastapi.responses import JSONResponse
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import logging
+from urllib.parse import unquote
 from utils.JWT import check_auth_middleware
+from core.file_stats import remove_live_files
 from controllers.history_controller import HistoryController
 
 from controllers.file_controller import (
@@ -31,6 +43,7 @@ from controllers.file_controller import (
     sharing_files,
 )
 from middlewares.sharing_token_middleware import verify_x_sharing_token
+from middlewares.admin_middleware import verify_admin_token
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from models.File_setup import (
@@ -38,6 +51,11 @@ from models.File_setup import (
     UploadInitResponse,
     CompleteUploadResponse,
     CompleteUploadRequest,
+    CompleteMultipartRequest,
+    AbortMultipartRequest,
+    PackInitRequest,
+    CompletePackRequest,
+    RetentionPolicyRequest,
     DownloadResponse,
     FileListResponse,
     MetricsResponse,
@@ -94,6 +112,34 @@ async def init_upload(
         )
 
 
+@router.post(
+    "/init-upload-policy",
+    status_code=status.HTTP_200_OK,
+)
+@limiter.limit("20/minute")
+async def init_upload_policy(
+    request: Request,
+    session: Dict[str, Any] = Depends(verify_x_sharing_token),
+):
+    """Issue one presigned POST policy for the whole sharing session"""
+    try:
+        controller = FileController()
+
+        result = await controller.init_upload_policy(session=session)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Unexpected error in init_upload_policy: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to initialize upload policy",
+        )
+
+
 @router.post(
     "/complete-upload",
     response_model=CompleteUploadResponse,
@@ -129,6 +175,226 @@ async def complete_upload(
         )
 
 
+@router.put(
+    "/upload-stream",
+    status_code=status.HTTP_201_CREATED,
+)
+@limiter.limit("20/minute")
+async def stream_upload(
+    request: Request,
+    x_filename: str = Header(...),
+    content_type: Optional[str] = Header(None),
+    x_file_size: Optional[int] = Header(None, ge=0),
+    session: Dict[str, Any] = Depends(verify_x_sharing_token),
+):
+    """Upload through the API for clients that can't reach storage directly.
+
+    The raw (optionally chunked) request body is the file; the filename is
+    sent URL-encoded in X-Filename and the size, if known, in X-File-Size.
+    """
+    try:
+        controller = FileController()
+
+        logger.info(
+            f"Stream upload request: session={session.get('sharing_session_ID')}"
+        )
+
+        result = await controller.stream_upload(
+            request.stream(),
+            filename=unquote(x_filename),
+            content_type=content_type,
+            declared_size=x_file_size,
+            session=session,
+        )
+
+        return JSONResponse(status_code=status.HTTP_201_CREATED, content=result)
+
+    except HTTPException:
+        raise
+
+    except ClientDisconnect:
+        logger.warning("Client disconnected during stream upload")
+        raise HTTPException(status_code=400, detail="Upload was interrupted")
+
+    except Exception as e:
+        logger.error(f"Unexpected error in stream_upload: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to upload file",
+        )
+
+
+@router.post(
+    "/packs/init",
+    status_code=status.HTTP_200_OK,
+)
+@limiter.limit("20/minute")
+async def init_pack(
+    request: Request,
+    payload: PackInitRequest,
+    session: Dict[str, Any] = Depends(verify_x_sharing_token),
+):
+    """Upload many small files as one pack object with a single PUT"""
+    try:
+        controller = FileController()
+
+        logger.info(
+            f"Init pack request: session={session.get('sharing_session_ID')}, "
+            f"files={len(payload.files)}"
+        )
+
+        result = await controller.init_pack(files=payload.files, session=session)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Unexpected error in init_pack: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to initialize pack upload",
+        )
+
+
+@router.post(
+    "/packs/complete",
+    status_code=status.HTTP_201_CREATED,
+)
+async def complete_pack(
+    payload: CompletePackRequest,
+    session: Dict[str, Any] = Depends(verify_x_sharing_token),
+):
+    """Record every file of an uploaded pack"""
+    try:
+        controller = FileController()
+
+        result = await controller.complete_pack(payload.pack_id, session)
+
+        return JSONResponse(status_code=status.HTTP_201_CREATED, content=result)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Unexpected error in complete_pack: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to complete pack upload",
+        )
+
+
+@router.post(
+    "/events/storage",
+    status_code=status.HTTP_200_OK,
+)
+async def ingest_storage_event(
+    event: Dict[str, Any] = Body(...),
+    authorization: Optional[str] = Header(None),
+):
+    """MinIO webhook target for s3:ObjectCreated notifications"""
+    FileController.verify_storage_event_token(authorization)
+
+    try:
+        controller = FileController()
+
+        result = await controller.ingest_storage_event(event)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        # Non-2xx makes MinIO keep the event in its queue and retry
+        logger.error(f"Unexpected error in ingest_storage_event: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to ingest storage event",
+        )
+
+
+@router.post(
+    "/multipart/complete",
+    status_code=status.HTTP_200_OK,
+)
+async def complete_multipart(
+    payload: CompleteMultipartRequest,
+    session: Dict[str, Any] = Depends(verify_x_sharing_token),
+):
+    """Assemble uploaded parts; call /complete-upload afterwards as usual"""
+    try:
+        controller = FileController()
+
+        result = await controller.complete_multipart(payload.model_dump(), session)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Unexpected error in complete_multipart: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to complete multipart upload",
+        )
+
+
+@router.get(
+    "/multipart/{file_id}/status",
+    status_code=status.HTTP_200_OK,
+)
+async def multipart_status(
+    file_id: str,
+    session: Dict[str, Any] = Depends(verify_x_sharing_token),
+):
+    """List missing parts of a resumable upload with fresh presigned URLs"""
+    try:
+        controller = FileController()
+
+        result = await controller.multipart_status(file_id, session)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Unexpected error in multipart_status: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to read upload status",
+        )
+
+
+@router.post(
+    "/multipart/abort",
+    status_code=status.HTTP_200_OK,
+)
+async def abort_multipart(
+    payload: AbortMultipartRequest,
+    session: Dict[str, Any] = Depends(verify_x_sharing_token),
+):
+    try:
+        controller = FileController()
+
+        result = await controller.abort_multipart(payload.model_dump(), session)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Unexpected error in abort_multipart: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to abort multipart upload",
+        )
+
+
 @router.get(
     "/download/{file_id}",
     response_model=DownloadResponse,
@@ -159,6 +425,40 @@ async def download_file(file_id: str, user: dict = Depends(check_auth_middleware
         )
 
 
+@router.get(
+    "/{file_id}/content",
+    status_code=status.HTTP_200_OK,
+)
+async def stream_file_content(
+    file_id: str,
+    range: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    user: dict = Depends(check_auth_middleware),
+):
+    """Stream file bytes with Range/If-Range support so media players can seek"""
+    try:
+        controller = FileController()
+
+        return await controller.stream_file_content(
+            user,
+            file_id=file_id,
+            range_header=range,
+            if_range=if_range,
+            if_none_match=if_none_match,
+        )
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Unexpected error in stream_file_content: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to stream file",
+        )
+
+
 @router.get(
     "/session/{session_id}/list",
     response_model=FileListResponse,
@@ -168,6 +468,15 @@ async def list_session_files(
     session_id: str,
     request: Request,
     include_deleted: bool = Query(default=False, description="Include deleted files"),
+    cursor: Optional[str] = Query(default=None, max_length=256),
+    limit: int = Query(
+        default=FileController.LIST_PAGE_SIZE,
+        ge=1,
+        le=FileController.LIST_MAX_PAGE_SIZE,
+    ),
+    stream: bool = Query(
+        default=False, description="Stream every file as NDJSON instead of a page"
+    ),
     session: Dict[str, Any] = Depends(verify_x_sharing_token),
 ):
     try:
@@ -178,8 +487,14 @@ async def list_session_files(
             request=request,
             include_deleted=include_deleted,
             session=session,
+            cursor=cursor,
+            limit=limit,
+            stream=stream,
         )
 
+        if stream:
+            return result
+
         return JSONResponse(status_code=status.HTTP_200_OK, content=result)
 
     except HTTPException:
@@ -223,15 +538,17 @@ async def delete_file(
             )
 
         if permanent:
-            # Permanent delete: remove from S3
-            await controller._cleanup_storage(file_doc["storage_key"])
-            logger.info(f"Permanently deleted file {file_id} from S3")
+            # Permanent delete: the S3 object goes once no shared copy uses it
+            await controller.release_storage(file_id, file_doc["storage_key"])
+            logger.info(f"Released storage for file {file_id}")
 
         # Update database (soft delete)
-        await controller.db.files.update_one(
-            {"file_id": file_id},
+        result = await controller.db.files.update_one(
+            {"file_id": file_id, "is_deleted": False},
             {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}},
         )
+        if result.modified_count:
+            await remove_live_files([file_doc])
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -254,6 +571,33 @@ async def delete_file(
         )
 
 
+@router.post(
+    "/{file_id}/restore",
+    status_code=status.HTTP_200_OK,
+)
+async def restore_file(
+    file_id: str,
+    session: Dict[str, Any] = Depends(verify_x_sharing_token),
+):
+    """Undo a soft delete"""
+    try:
+        controller = FileController()
+
+        result = await controller.restore_file(file_id, session)
+
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Unexpected error in restore_file: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to restore file",
+        )
+
+
 @router.get(
     "/metrics",
     response_model=MetricsResponse,
@@ -353,24 +697,30 @@ async def debug_bucket_contents(
     status_code=status.HTTP_200_OK,
     include_in_schema=True,
 )
-async def trigger_cleanup():
+async def trigger_cleanup(_: None = Depends(verify_admin_token)):
     """Manually trigger file cleanup"""
     try:
-        controller = FileController()
-        from controllers.file_controller import BackgroundCleaner
+        from controllers.lifecycle_controller import LifecycleController
 
-        cleaner = BackgroundCleaner(controller)
-        await cleaner.cleanup_expired_files()
+        result = await LifecycleController().run_exclusive()
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A lifecycle run is already in progress",
+            )
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "success": True,
                 "message": "Cleanup completed",
+                **result,
                 "timestamp": datetime.utcnow().isoformat(),
             },
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Manual cleanup failed: {e}", exc_info=True)
         raise HTTPException(
@@ -378,9 +728,73 @@ async def trigger_cleanup():
         )
 
 
+@router.post(
+    "/reconcile",
+    status_code=status.HTTP_200_OK,
+    include_in_schema=True,
+)
+async def reconcile_storage(_: None = Depends(verify_admin_token)):
+    """Compare the bucket with the files collection (report only; purge via the CLI)"""
+    try:
+        from controllers.reconcile_controller import ReconcileController
+
+        result = await ReconcileController().reconcile()
+
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"success": True, **result},
+        )
+
+    except Exception as e:
+        logger.error(f"Storage reconcile failed: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Reconcile failed"
+        )
+
+
+@router.put("/retention/session")
+async def set_session_retention(
+    payload: RetentionPolicyRequest,
+    session: Dict[str, Any] = Depends(verify_x_sharing_token),
+    user: dict = Depends(check_auth_middleware),
+):
+    """Retention for every file in the current sharing session (sender only)"""
+    from controllers.lifecycle_controller import LifecycleController
+
+    return await LifecycleController().set_session_retention(
+        session, user, payload.retention_days
+    )
+
+
+@router.put("/retention/user")
+async def set_user_retention(
+    payload: RetentionPolicyRequest,
+    user: dict = Depends(check_auth_middleware),
+):
+    """Default retention for the user's files (session policies take precedence)"""
+    from controllers.lifecycle_controller import LifecycleController
+
+    return await LifecycleController().set_user_retention(
+        user, payload.retention_days
+    )
+
+
 @router.get("/user/files")
-async def get_files(user: dict = Depends(check_auth_middleware)):
-    return await File_User.get_files_uploaded_by_users(user)
+async def get_files(
+    cursor: Optional[str] = Query(default=None, max_length=256),
+    limit: int = Query(
+        default=FileController.LIST_PAGE_SIZE,
+        ge=1,
+        le=FileController.LIST_MAX_PAGE_SIZE,
+    ),
+    stream: bool = Query(
+        default=False, description="Stream every file as NDJSON instead of a page"
+    ),
+    user: dict = Depends(check_auth_middleware),
+):
+    return await File_User.get_files_uploaded_by_users(
+        user, cursor=cursor, limit=limit, stream=stream
+    )
 
 
 @router.delete("/user/files")
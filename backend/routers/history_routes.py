@@ -1,3 +1,4 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from core.database import get_db
 from utils.JWT import check_auth_middleware
@@ -20,15 +21,17 @@ async def create_history(data: dict, user=Depends(check_auth_middleware)):
 @router.get("/")
 async def get_history(
     type: str = Query("all", enum=["all", "sent", "received"]),
-    page: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, max_length=256),
     limit: int = Query(20, ge=1, le=100),
+    with_total: bool = Query(False),
     user=Depends(check_auth_middleware),
 ):
     return await HistoryController.get_history(
         user=user,
         type=type,
-        page=page,
+        cursor=cursor,
         limit=limit,
+        with_total=with_total,
     )
 
 
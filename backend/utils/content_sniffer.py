@@ -0,0 +1,110 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import magic
+from botocore.exceptions import ClientError
+from core.config import MINIO_BUCKET
+from core.s3_config import get_s3_internal
+
+# libmagic only needs the first couple of KB to identify a file
+SNIFF_BYTES = 2048
+SNIFF_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=SNIFF_WORKERS, thread_name_prefix="sniff")
+_local = threading.local()
+
+
+def _detect(buffer: bytes) -> str:
+    # magic.from_buffer shares one cookie behind a lock; one per worker thread
+    # lets detections actually run in parallel
+    detector = getattr(_local, "detector", None)
+    if detector is None:
+        detector = _local.detector = magic.Magic(mime=True)
+    return detector.from_buffer(buffer)
+
+
+async def detect_mime(buffer: bytes) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _detect, buffer)
+
+
+async def sniff_object(storage_key: str, size: Optional[int] = None) -> str:
+    """Detected MIME type of a stored object, from a ranged GET of its first bytes"""
+    if size == 0:
+        return await detect_mime(b"")
+
+    s3_internal = await get_s3_internal()
+    try:
+        obj = await s3_internal.get_object(
+            Bucket=MINIO_BUCKET,
+            Key=storage_key,
+            Range=f"bytes=0-{SNIFF_BYTES - 1}",
+        )
+    except ClientError as e:
+        # Zero-length objects can't satisfy any range
+        if e.response["Error"]["Code"] == "InvalidRange":
+            return await detect_mime(b"")
+        raise
+
+    async with obj["Body"] as body:
+        head = await body.read()
+
+    return await detect_mime(head)
+
+
+async def sniff_pack(
+    storage_key: str, members: List[Tuple[str, int, int]]
+) -> Dict[str, str]:
+    """Detected MIME type of each `(file_id, offset, size)` member of a pack object.
+
+    The pack is read once, front to back, keeping only the first SNIFF_BYTES
+    of every member, instead of one ranged GET per packed file.
+    """
+    windows = sorted(
+        (offset, offset + min(size, SNIFF_BYTES), file_id)
+        for file_id, offset, size in members
+    )
+    heads = {file_id: bytearray() for _, _, file_id in windows}
+
+    s3_internal = await get_s3_internal()
+    obj = await s3_internal.get_object(
+        Bucket=MINIO_BUCKET,
+        Key=storage_key,
+        # Nothing past the last window matters
+        Range=f"bytes=0-{max(stop for _, stop, _ in windows) - 1}",
+    )
+
+    position = 0
+    first = 0
+    async with obj["Body"] as body:
+        async for chunk in body.iter_chunks(256 * 1024):
+            end = position + len(chunk)
+
+            while first < len(windows) and windows[first][1] <= position:
+                first += 1
+
+            i = first
+            while i < len(windows) and windows[i][0] < end:
+                start, stop, file_id = windows[i]
+                heads[file_id].extend(
+                    chunk[max(start - position, 0) : min(stop, end) - position]
+                )
+                i += 1
+
+            position = end
+
+    detected = await asyncio.gather(*[detect_mime(bytes(h)) for h in heads.values()])
+    return dict(zip(heads, detected))
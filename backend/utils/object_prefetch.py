@@ -0,0 +1,150 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from core.config import MINIO_BUCKET
+from core.s3_config import get_s3_internal
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class ByteBudget:
+    """Caps the bytes buffered ahead of the consumer across all in-flight objects.
+
+    The object the consumer is currently reading (the head) is never made to
+    wait, otherwise objects queued behind it could hold the whole budget and
+    stall the pipeline.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.head = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, index: int, size: int):
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: index <= self.head or self.used + size <= self.limit
+            )
+            self.used += size
+
+    async def release(self, size: int):
+        async with self._cond:
+            self.used -= size
+            self._cond.notify_all()
+
+    async def advance(self, index: int):
+        async with self._cond:
+            self.head = index
+            self._cond.notify_all()
+
+
+class ObjectPrefetcher:
+    """Download up to `concurrency` objects at once and hand them out in input order.
+
+    Each item is a dict with at least `storage_key`, and optionally a
+    `byte_range` Range header to read only part of the object. Iterating yields
+    `(item, content_length, chunks)` tuples; items whose object could not be
+    opened are logged and skipped, mirroring the old sequential loop.
+    """
+
+    def __init__(
+        self,
+        items: List[Dict[str, Any]],
+        concurrency: int = 4,
+        byte_budget: int = 64 * 1024 * 1024,
+        chunk_size: int = 256 * 1024,
+    ):
+        self.items = items
+        self.concurrency = max(1, concurrency)
+        self.chunk_size = chunk_size
+        self.budget = ByteBudget(byte_budget)
+        self._queues = [asyncio.Queue() for _ in items]
+        self._next_index = 0
+        self._workers: List[asyncio.Task] = []
+
+    async def _worker(self):
+        while self._next_index < len(self.items):
+            index = self._next_index
+            self._next_index += 1
+            await self._fetch(index)
+
+    async def _fetch(self, index: int):
+        item = self.items[index]
+        queue = self._queues[index]
+
+        try:
+            s3_internal = await get_s3_internal()
+            params = {"Bucket": MINIO_BUCKET, "Key": item["storage_key"]}
+            if item.get("byte_range"):
+                # e.g. a small file stored inside a pack object
+                params["Range"] = item["byte_range"]
+            obj = await s3_internal.get_object(**params)
+        except Exception as e:
+            await queue.put(e)
+            return
+
+        body = obj["Body"]
+        try:
+            await queue.put(obj.get("ContentLength"))
+
+            async for chunk in body.iter_chunks(self.chunk_size):
+                await self.budget.acquire(index, len(chunk))
+                await queue.put(chunk)
+
+            await queue.put(_DONE)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            body.close()
+
+    async def _drain(self, index: int) -> AsyncIterator[bytes]:
+        queue = self._queues[index]
+
+        while True:
+            chunk = await queue.get()
+
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+
+            await self.budget.release(len(chunk))
+            yield chunk
+
+    async def __aiter__(
+        self,
+    ) -> AsyncIterator[Tuple[Dict[str, Any], Optional[int], AsyncIterator[bytes]]]:
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(min(self.concurrency, len(self.items)))
+        ]
+
+        try:
+            for index, item in enumerate(self.items):
+                await self.budget.advance(index)
+
+                first = await self._queues[index].get()
+                if isinstance(first, Exception):
+                    logger.warning(f"Prefetch failed for {item['storage_key']}: {first}")
+                    continue
+
+                yield item, first, self._drain(index)
+        finally:
+            for task in self._workers:
+                task.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
@@ -0,0 +1,78 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+"""Keyset (cursor) pagination over `(sort_field desc, tiebreak desc)`.
+
+The continuation token is opaque to clients: the last row's sort value and
+unique tiebreaker, JSON-encoded and base64url'd. Resuming from it is a range
+seek on a compound index, so page N costs the same as page 1.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple, Union
+from fastapi import HTTPException
+
+
+def encode_cursor(sort_value: Union[datetime, str], tiebreak: str) -> str:
+    """`sort_value` may also be a date the query already rendered as ISO text"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, tiebreak], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        sort_value, tiebreak = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), str(tiebreak)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(
+    token: Optional[str], sort_field: str, tiebreak_field: str
+) -> Dict[str, Any]:
+    """Filter for the rows after `token` in `(sort_field, tiebreak_field)` desc order.
+
+    The `$lte` bound on the sort field is redundant with the `$or` but gives
+    the planner a tight index range to seek to.
+    """
+    if not token:
+        return {}
+
+    sort_value, tiebreak = decode_cursor(token)
+    return {
+        sort_field: {"$lte": sort_value},
+        "$or": [
+            {sort_field: {"$lt": sort_value}},
+            {tiebreak_field: {"$lt": tiebreak}},
+        ],
+    }
+
+
+def next_cursor(
+    rows: list, limit: int, sort_field: str, tiebreak_field: str
+) -> Optional[str]:
+    """Token for the page after `rows`, or None when this was the last page.
+
+    Callers fetch `limit + 1` rows; the extra row only signals that more exist
+    and is dropped here.
+    """
+    if len(rows) <= limit:
+        return None
+
+    del rows[limit:]
+    last = rows[-1]
+    return encode_cursor(last[sort_field], last[tiebreak_field])
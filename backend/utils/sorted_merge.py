@@ -0,0 +1,47 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import heapq
+from typing import AsyncIterator, Dict, Set, Tuple
+
+_END = object()
+
+
+async def merge_sorted_keys(
+    sources: Dict[str, AsyncIterator[str]],
+) -> AsyncIterator[Tuple[str, Set[str]]]:
+    """K-way merge of ascending key streams, one buffered key per source.
+
+    Yields each distinct key once, with the names of the sources it came
+    from. Duplicates within a source (e.g. several documents sharing one
+    storage key) collapse into a single entry.
+    """
+    heap = []
+
+    async def _push(name: str, iterator: AsyncIterator[str]):
+        key = await anext(iterator, _END)
+        if key is not _END:
+            heapq.heappush(heap, (key, name))
+
+    for name, iterator in sources.items():
+        await _push(name, iterator)
+
+    while heap:
+        key = heap[0][0]
+        names = set()
+
+        while heap and heap[0][0] == key:
+            _, name = heapq.heappop(heap)
+            names.add(name)
+            await _push(name, sources[name])
+
+        yield key, names
@@ -0,0 +1,106 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Rendering runs in spawned worker processes, so this module must stay free of
+# app imports (database, storage clients) that would be re-initialised there.
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 75
+THUMBNAIL_SUFFIX = ".thumb.webp"
+PREVIEW_WORKERS = 2
+
+IMAGE_MIME_TYPES = {
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/webp",
+    "image/bmp",
+    "image/tiff",
+}
+PDF_MIME_TYPE = "application/pdf"
+PREVIEWABLE_MIME_TYPES = IMAGE_MIME_TYPES | {PDF_MIME_TYPE}
+
+# Refuse pathological images instead of decoding gigapixels in a worker
+MAX_IMAGE_PIXELS = 50_000_000
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def thumbnail_key(storage_key: str) -> str:
+    """Derived object stored next to the original"""
+    return f"{storage_key}{THUMBNAIL_SUFFIX}"
+
+
+def _to_webp(image) -> bytes:
+    from PIL import ImageOps
+
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(THUMBNAIL_SIZE)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    out = io.BytesIO()
+    image.save(out, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+    return out.getvalue()
+
+
+def render_thumbnail(data: bytes, mime_type: str) -> bytes:
+    """WebP thumbnail of an image, or of the first page of a PDF"""
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+    if mime_type == PDF_MIME_TYPE:
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(data)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            scale = max(THUMBNAIL_SIZE) / max(width, height, 1)
+            image = page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+        return _to_webp(image)
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.seek(0)
+        return _to_webp(image)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the parent has an event loop and driver threads running
+        _pool = ProcessPoolExecutor(
+            max_workers=PREVIEW_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def generate_thumbnail(data: bytes, mime_type: str) -> bytes:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), render_thumbnail, data, mime_type)
+
+
+def shutdown_preview_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
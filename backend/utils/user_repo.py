@@ -106,31 +106,3 @@ async def get_or_create_guest_session(request: Request, response: Response):
             "created_at": datetime.utcnow(),
             "expires_at": datetime.utcnow() + timedelta(hours=24),
         }
-
-
-async def cleanup_expired_sessions():
-    try:
-        result = await db.guest_sessions.delete_many(
-            {"expires_at": {"$lt": datetime.utcnow()}}
-        )
-        print(f"Cleaned up {result.deleted_count} expired guest sessions")
-        return result.deleted_count
-    except Exception as e:
-        print(f"Error in cleanup_expired_sessions: {e}")
-        return 0
-
-
-async def cleanup_expired_qr_codes():
-    try:
-        result = await db.qr_codes.update_many(
-            {
-                "expires_at": {"$lt": datetime.utcnow()},
-                "is_active": True,
-            },
-            {"$set": {"is_active": False, "updated_at": datetime.utcnow()}},
-        )
-        print(f"Deactivated {result.modified_count} expired QR codes")
-        return result.modified_count
-    except Exception as e:
-        print(f"Error in cleanup_expired_qr_codes: {e}")
-        return 0
@@ -0,0 +1,97 @@
+# Copyright 2026 sharexpress
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND.
+#
+import os
+import time
+import zipfile
+from typing import AsyncIterable, AsyncIterator, Optional, Tuple
+
+# (archive name, size hint in bytes, async iterator of raw object bytes)
+ZipEntry = Tuple[str, Optional[int], AsyncIterator[bytes]]
+
+
+class _ChunkSink:
+    """Write-only file object that buffers whatever zipfile wrote since the last drain.
+
+    It has no tell()/seek(), so zipfile switches to its unseekable mode and
+    writes data descriptors after each entry instead of seeking back to
+    patch the local header.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _unique_name(name: str, seen: set) -> str:
+    """Zip readers overwrite duplicate entries, so suffix repeats like a file manager would"""
+    name = name or "file"
+    candidate = name
+    stem, ext = os.path.splitext(name)
+    counter = 1
+
+    while candidate in seen:
+        candidate = f"{stem} ({counter}){ext}"
+        counter += 1
+
+    seen.add(candidate)
+    return candidate
+
+
+async def stream_zip(
+    entries: AsyncIterable[ZipEntry],
+    compression: int = zipfile.ZIP_DEFLATED,
+) -> AsyncIterator[bytes]:
+    """Build a ZIP archive incrementally, yielding bytes as soon as they are produced.
+
+    Memory use is bounded by one source chunk plus the compressor state,
+    independent of how many entries or bytes go into the archive.
+    """
+    sink = _ChunkSink()
+    seen = set()
+
+    with zipfile.ZipFile(sink, "w", compression, allowZip64=True) as archive:
+        async for name, size, chunks in entries:
+            info = zipfile.ZipInfo(
+                _unique_name(name, seen), date_time=time.localtime()[:6]
+            )
+            info.compress_type = compression
+            info.file_size = size or 0
+
+            # force_zip64 when the size is unknown so a large object can't overflow
+            with archive.open(info, "w", force_zip64=size is None) as dest:
+                async for chunk in chunks:
+                    dest.write(chunk)
+
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Central directory, written by ZipFile.close()
+    data = sink.drain()
+    if data:
+        yield data
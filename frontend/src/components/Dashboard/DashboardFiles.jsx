@@ -21,7 +21,12 @@ const DashboardFiles = () => {
   const [debouncedSearch, setDebouncedSearch] = useState("");
   const [sortBy, setSortBy] = useState("date_desc");
   const dispatch = useDispatch();
-  const { userFiles = [], loadingFiles } = useSelector((state) => state.files);
+  const {
+    userFiles = [],
+    userFilesCursor,
+    loadingFiles,
+    loadingMoreFiles,
+  } = useSelector((state) => state.files);
 
   const [view, setView] = useState("list");
   const [deleteModalOpen, setDeleteModalOpen] = useState(false);
@@ -202,6 +207,16 @@ const DashboardFiles = () => {
             ))}
           </div>
         )}
+
+        {!loadingFiles && userFilesCursor && (
+          <button
+            onClick={() => dispatch(fetchUserFiles(userFilesCursor))}
+            disabled={loadingMoreFiles}
+            className="self-center mt-6 px-4 py-1.5 text-xs text-[#8a8a8a] hover:text-white border border-[#ffffff10] rounded-md transition disabled:opacity-50"
+          >
+            {loadingMoreFiles ? "Loading..." : "Load more"}
+          </button>
+        )}
       </div>
 
       <ConfirmDeleteModal
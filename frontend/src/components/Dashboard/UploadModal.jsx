@@ -382,10 +382,12 @@ const UploadModal = ({ onClose }) => {
 
   const {
     userFiles = [],
+    userFilesCursor,
     files = [],
     progressMap = {},
     statusMap = {},
     loadingFiles,
+    loadingMoreFiles,
   } = useSelector((state) => state.files);
 
   const [activeTab, setActiveTab] = useState("files");
@@ -768,6 +770,18 @@ const UploadModal = ({ onClose }) => {
                     />
                   ))}
                 </div>
+
+                {userFilesCursor && (
+                  <div className="flex justify-center pb-6">
+                    <button
+                      onClick={() => dispatch(fetchUserFiles(userFilesCursor))}
+                      disabled={loadingMoreFiles}
+                      className="px-4 py-1.5 text-xs text-[#8a8a8a] hover:text-white border border-[#ffffff10] rounded-md transition disabled:opacity-50"
+                    >
+                      {loadingMoreFiles ? "Loading..." : "Load more"}
+                    </button>
+                  </div>
+                )}
               </>
             )}
           </div>
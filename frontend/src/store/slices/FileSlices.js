@@ -1,6 +1,8 @@
 import { createAsyncThunk, createSlice } from "@reduxjs/toolkit";
 import { api } from "../../api/api";
 
+const USER_FILES_PAGE_SIZE = 100;
+
 export const initUpload = createAsyncThunk(
   "files/initUpload",
   async (files, { rejectWithValue }) => {
@@ -35,15 +37,15 @@ export const completeUpload = createAsyncThunk(
   },
 );
 
+// One page of the cursor-paginated listing; pass next_cursor to load the next
 export const fetchUserFiles = createAsyncThunk(
   "files/fetchUserFiles",
-  async (_, { rejectWithValue }) => {
+  async (cursor = null, { rejectWithValue }) => {
     try {
-      const res = await api.get("/files/user/files");
-
-      console.log("API RESPONSE:", res.data);
-
-      return res.data || [];
+      const res = await api.get("/files/user/files", {
+        params: { limit: USER_FILES_PAGE_SIZE, ...(cursor && { cursor }) },
+      });
+      return res.data;
     } catch (err) {
       return rejectWithValue(err.response?.data || "Fetch failed");
     }
@@ -70,7 +72,9 @@ const FileSlice = createSlice({
     error: null,
     files: [],
     userFiles: [],
+    userFilesCursor: null,
     loadingFiles: false,
+    loadingMoreFiles: false,
     progressMap: {},
     statusMap: {},
   },
@@ -147,24 +151,35 @@ const FileSlice = createSlice({
         state.error = action.payload;
       })
 
-      .addCase(fetchUserFiles.pending, (state) => {
-        state.loadingFiles = true;
+      .addCase(fetchUserFiles.pending, (state, action) => {
+        if (action.meta.arg) {
+          state.loadingMoreFiles = true;
+        } else {
+          state.loadingFiles = true;
+        }
       })
 
       .addCase(fetchUserFiles.fulfilled, (state, action) => {
-        console.log("REDUX PAYLOAD:", action.payload);
+        const files = action.payload?.files || [];
 
         state.loadingFiles = false;
-        state.userFiles = action.payload || [];
+        state.loadingMoreFiles = false;
+        // A cursor means "next page": append; otherwise start over
+        state.userFiles = action.meta.arg
+          ? [...state.userFiles, ...files]
+          : files;
+        state.userFilesCursor = action.payload?.next_cursor || null;
       })
 
       .addCase(fetchUserFiles.rejected, (state, action) => {
         state.loadingFiles = false;
+        state.loadingMoreFiles = false;
         state.error = action.payload;
       })
 
       .addCase(deleteAllFiles.fulfilled, (state) => {
         state.userFiles = [];
+        state.userFilesCursor = null;
       });
   },
 });